@@ -0,0 +1,244 @@
+import argparse
+import collections
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import chess.pgn
+import chess.polyglot
+try:
+    # Opcional: saída em Parquet
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+import metrics
+from chess_environment.chess_env import ChessEnvironment
+from llm_player.backends import backend_dependency_error
+from llm_player.llm_agent import LLMAgent
+from rl_player.rl_agent import RLAgent
+
+AGENTS = ("rl", "llm")
+
+
+def read_positions(path):
+    # Gerador: lê uma partida (PGN) ou uma linha (FEN/EPD) por vez, então o arquivo nunca fica inteiro na memória
+    with open(path, encoding="utf-8", errors="replace") as input_file:
+        if path.lower().endswith(".pgn"):
+            game_index = 0
+            while (game := chess.pgn.read_game(input_file)) is not None:
+                game_index += 1
+                board = game.board()
+                yield f"game {game_index} ply 0", board.copy(stack=False)
+                for ply, move in enumerate(game.mainline_moves(), 1):
+                    board.push(move)
+                    yield f"game {game_index} ply {ply}", board.copy(stack=False)
+        else:
+            for line_number, line in enumerate(input_file, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    board = chess.Board(line)
+                except ValueError:
+                    try:
+                        board, _ = chess.Board.from_epd(line)
+                    except ValueError:
+                        print(f"Skipping invalid position on line {line_number}: {line[:80]}")
+                        continue
+                yield f"line {line_number}", board
+
+
+class PositionFilter:
+    # Filtro de Bloom sobre o hash Zobrist: memória fixa para qualquer tamanho de arquivo.
+    # Um falso positivo descarta uma posição nova (taxa ~0,05% com 5 milhões de posições nos 16 MB padrão).
+    def __init__(self, bits=1 << 27, hashes=4):
+        self.mask = bits - 1
+        if bits & self.mask:
+            raise ValueError("the number of bits must be a power of two")
+        self.bits = bytearray(bits >> 3)
+        self.hashes = hashes
+
+    def add(self, key):
+        # True se a posição ainda não tinha sido vista
+        h1, h2 = key & 0xFFFFFFFF, (key >> 32) | 1
+        new = False
+        for i in range(self.hashes):
+            bit = (h1 + i * h2) & self.mask
+            byte, bit_mask = bit >> 3, 1 << (bit & 7)
+            if not self.bits[byte] & bit_mask:
+                self.bits[byte] |= bit_mask
+                new = True
+        return new
+
+
+def unique_positions(positions, position_filter, stats):
+    for source, board in positions:
+        stats["read"] += 1
+        if not position_filter.add(chess.polyglot.zobrist_hash(board)):
+            stats["duplicates"] += 1
+        elif board.is_game_over():
+            stats["game_over"] += 1  # Sem lance a escolher
+        else:
+            yield source, board
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.file = open(path, "w")
+
+    def write(self, records):
+        self.file.writelines(json.dumps(record) + "\n" for record in records)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    # Junta os batches em row groups de tamanho fixo: Parquet com row groups pequenos é lento de ler
+    def __init__(self, path, agents, row_group_size=65536):
+        fields = [("source", pa.string()), ("fen", pa.string())]
+        for agent in agents:
+            fields += [(f"{agent}_move", pa.string()), (f"{agent}_ms", pa.float64())]
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.row_group_size = row_group_size
+        self.rows = []
+
+    def write(self, records):
+        self.rows.extend(records)
+        if len(self.rows) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self.rows:
+            self.writer.write_table(pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+def in_slices(move_fn, size):
+    # Passa o batch para move_fn em fatias de no máximo size posições
+    return lambda boards: [move for start in range(0, len(boards), size) for move in move_fn(boards[start:start + size])]
+
+
+def timed_batch(agent, move_fn, inputs):
+    # Roda no pool do agente; a latência de cada posição é o tempo do batch dividido pelo tamanho dele
+    start_time = time.perf_counter()
+    with metrics.thread_profile():
+        moves = move_fn(inputs)
+    elapsed = time.perf_counter() - start_time
+    metrics.observe("analysis_batch_seconds", elapsed, agent=agent)
+    return moves, elapsed * 1000 / len(inputs)
+
+
+def analyze_file(path, writer, move_fns, batch_size=64, workers=1, max_pending=4, filter_bits=1 << 27):
+    # Leitor -> filtro de duplicatas -> batches -> um pool limitado por agente -> escrita na ordem de leitura.
+    # No máximo max_pending batches ficam em voo: quando a fila enche, o leitor espera o mais antigo terminar
+    stats = collections.Counter(read=0, duplicates=0, game_over=0, analyzed=0)
+    positions = unique_positions(read_positions(path), PositionFilter(filter_bits), stats)
+    pools = {agent: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{agent}-analysis") for agent in move_fns}
+    pending = collections.deque()
+
+    def write_oldest():
+        batch, futures = pending.popleft()
+        results = {agent: future.result() for agent, future in futures.items()}
+        records = []
+        for row, (source, board) in enumerate(batch):
+            record = {"source": source, "fen": board.fen()}
+            for agent, (moves, latency_ms) in results.items():
+                record[f"{agent}_move"] = moves[row]
+                record[f"{agent}_ms"] = latency_ms
+            records.append(record)
+        writer.write(records)
+        stats["analyzed"] += len(records)
+        metrics.inc("analysis_positions", len(records))
+
+    try:
+        for batch in batched(positions, batch_size):
+            boards = [board for _, board in batch]
+            futures = {agent: pools[agent].submit(timed_batch, agent, move_fn, boards) for agent, move_fn in move_fns.items()}
+            pending.append((batch, futures))
+            if len(pending) >= max_pending:
+                write_oldest()
+        while pending:
+            write_oldest()
+    finally:
+        for pool in pools.values():
+            pool.shutdown(cancel_futures=True)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run both agents over every position of a FEN/EPD list or PGN file")
+    parser.add_argument("input", help="PGN file (.pgn) or a text file with one FEN/EPD per line")
+    parser.add_argument("--output", default="analysis.jsonl", help="JSON lines, or Parquet when the name ends in .parquet")
+    parser.add_argument("--agents", nargs="+", default=list(AGENTS), choices=AGENTS)
+    parser.add_argument("--model", default="rl_model.zip")
+    parser.add_argument("--llm-backend", default="eager", choices=["eager", "int8", "onnx"])
+    parser.add_argument("--batch-size", type=int, default=64, help="positions read and handed to the agents at a time")
+    parser.add_argument("--rl-batch-size", type=int, default=64, help="positions per RL policy forward pass")
+    parser.add_argument("--llm-batch-size", type=int, default=4,
+                        help="positions per LLM scoring call; each position scores all of its legal moves")
+    parser.add_argument("--workers", type=int, default=1, help="batches each agent runs at the same time")
+    parser.add_argument("--max-pending", type=int, default=4, help="batches in flight before reading pauses")
+    parser.add_argument("--filter-mb", type=int, default=16, help="memory for the duplicate filter, rounded down to a power of two")
+    metrics.add_cli_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        parser.error(f"input not found: {args.input}")
+    parquet = args.output.lower().endswith(".parquet")
+    if parquet and pq is None:
+        parser.error("Parquet output requires pyarrow (pip install pyarrow)")
+    if "llm" in args.agents and (error := backend_dependency_error(args.llm_backend)):
+        parser.error(error)
+    if "rl" in args.agents and not os.path.exists(args.model):
+        parser.error(f"RL model not found: {args.model} (train it first, or pass --agents llm)")
+
+    move_fns = {}
+    if "rl" in args.agents:
+        rl_player = RLAgent(ChessEnvironment())
+        rl_player.load(args.model)
+        move_fns["rl"] = in_slices(rl_player.get_actions, max(1, args.rl_batch_size))
+    if "llm" in args.agents:
+        # Só o modo score tem versão em batch
+        llm_player = LLMAgent(mode="score", verbose=False, backend=args.llm_backend)
+        # Cada posição vira dezenas de linhas (uma por lance legal): o LLM recebe fatias pequenas do batch
+        move_fns["llm"] = in_slices(lambda boards: llm_player.get_actions([board.fen() for board in boards]),
+                                    max(1, args.llm_batch_size))
+
+    filter_bits = 1 << ((max(1, args.filter_mb) << 23).bit_length() - 1)
+    writer = ParquetWriter(args.output, move_fns) if parquet else JsonlWriter(args.output)
+    start_time = time.perf_counter()
+    with metrics.instrumented(args, prefix="analysis"):
+        try:
+            stats = analyze_file(args.input, writer, move_fns, max(1, args.batch_size), max(1, args.workers),
+                                 max(1, args.max_pending), filter_bits)
+        finally:
+            writer.close()
+    elapsed = time.perf_counter() - start_time
+    print(f"Read {stats['read']} positions: {stats['analyzed']} analyzed, {stats['duplicates']} duplicates, "
+          f"{stats['game_over']} finished games skipped in {elapsed:.1f}s "
+          f"({stats['analyzed'] / max(elapsed, 1e-9):.0f} positions/s); results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
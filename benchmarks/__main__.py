@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+
+from benchmarks.common import compare, load_results, save_results
+
+SUITES = ("encoder", "env", "rl", "llm", "gui")
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+
+def run_suites(args):
+    results = {}
+    for suite in args.suites:
+        print(f"Running {suite} benchmarks...")
+        if suite == "encoder":
+            from benchmarks import encoder_bench
+            results.update(encoder_bench.run())
+        elif suite == "env":
+            from benchmarks import env_bench
+            results.update(env_bench.run())
+        elif suite == "rl":
+            from benchmarks import agents_bench
+            results.update(agents_bench.run_rl(model_path=args.rl_model))
+        elif suite == "llm":
+            from benchmarks import agents_bench
+            results.update(agents_bench.run_llm(model_name=args.llm_model, mode=args.llm_mode, backend=args.llm_backend))
+        elif suite == "gui":
+            from benchmarks import gui_bench
+            results.update(gui_bench.run())
+    return results
+
+
+def print_results(results):
+    for name, result in sorted(results.items()):
+        print(f"  {name:<36} {result['value']:12.4f} {result['unit']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Hot-path benchmarks with JSON baselines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run benchmarks and write the results as JSON")
+    run_parser.add_argument("--suites", nargs="+", choices=SUITES, default=["encoder", "env", "rl", "gui"])
+    run_parser.add_argument("--output", help="results file (default: baselines/<name>.json)")
+    run_parser.add_argument("--name", default="baseline", help="baseline name when --output is not given")
+    run_parser.add_argument("--rl-model", default="rl_model.zip")
+    run_parser.add_argument("--llm-model", default="gpt2-large")
+    run_parser.add_argument("--llm-mode", default="score", choices=["score", "sample"])
+    run_parser.add_argument("--llm-backend", default="eager", choices=["eager", "int8", "onnx"])
+
+    compare_parser = subparsers.add_parser("compare", help="flag regressions of a run against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown (0.10 = 10%%)")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_suites(args)
+        output = args.output
+        if output is None:
+            os.makedirs(BASELINE_DIR, exist_ok=True)
+            output = os.path.join(BASELINE_DIR, f"{args.name}.json")
+        save_results(results, output)
+        print_results(results)
+        print(f"Results written to {output}")
+        return 0
+
+    rows = compare(load_results(args.baseline), load_results(args.current), args.threshold)
+    regressions = 0
+    for name, base, value, change, regressed in rows:
+        flag = "REGRESSION" if regressed else "ok"
+        print(f"  {name:<36} {base:12.4f} -> {value:12.4f} ({change:+7.1%}) {flag}")
+        regressions += regressed
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
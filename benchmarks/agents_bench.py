@@ -0,0 +1,47 @@
+import os
+import statistics
+
+from benchmarks.common import best_time, metric
+from benchmarks.encoder_bench import random_boards
+from chess_environment.chess_env import ChessEnvironment
+from rl_player.rl_agent import PPO, MaskablePPO, RLAgent
+
+
+def run_rl(model_path="rl_model.zip", positions=64, repeat=5):
+    agent = RLAgent(ChessEnvironment())
+    if os.path.exists(model_path):
+        agent.load(model_path)
+    else:
+        # Sem modelo treinado, uma política aleatória tem o mesmo custo de inferência
+        agent.model = (MaskablePPO or PPO)("MlpPolicy", agent.env)
+
+    boards = [board for board in random_boards(positions) if not board.is_game_over()]
+    state_time = best_time(lambda: [agent.board_to_state(board) for board in boards], repeat=repeat) / len(boards)
+    action_time = best_time(lambda: [agent.get_action(board) for board in boards], repeat=repeat) / len(boards)
+    batch_time = best_time(lambda: agent.get_actions(boards), repeat=repeat) / len(boards)
+
+    return {
+        "rl.board_to_state": metric(state_time * 1e6, "us/position", False),
+        "rl.get_action": metric(action_time * 1e3, "ms/move", False),
+        "rl.get_actions_batch": metric(batch_time * 1e3, "ms/move", False),
+    }
+
+
+def run_llm(model_name="gpt2-large", mode="score", backend="eager", positions=8):
+    from llm_player.llm_agent import SimpleLLM
+
+    llm = SimpleLLM(mode=mode, backend=backend, model_name=model_name)
+    boards = [board for board in random_boards(positions, seed=1) if not board.is_game_over()]
+
+    latencies = []
+    attempts = []
+    for board in boards:
+        stats = {}
+        llm.generate_move(board, stats=stats)
+        latencies.append(stats["latency"])
+        attempts.append(stats["attempts"])
+
+    return {
+        f"llm.{mode}.{backend}.generate_move": metric(statistics.median(latencies), "s/move", False),
+        f"llm.{mode}.{backend}.attempts": metric(statistics.mean(attempts), "attempts/move", False),
+    }
@@ -0,0 +1,45 @@
+import json
+import platform
+import time
+import timeit
+
+# Cada métrica: {"value": ..., "unit": ..., "higher_is_better": ...}
+
+
+def metric(value, unit, higher_is_better):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def best_time(fn, number=1, repeat=5):
+    # Melhor de `repeat` execuções, em segundos por chamada de fn
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def save_results(results, path):
+    payload = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+    with open(path, "w") as results_file:
+        json.dump(payload, results_file, indent=2)
+
+
+def load_results(path):
+    with open(path) as results_file:
+        return json.load(results_file)["results"]
+
+
+def compare(baseline, current, threshold):
+    # Devolve (nome, valor base, valor atual, variação relativa, regrediu?) para as métricas em comum
+    rows = []
+    for name in sorted(set(baseline) & set(current)):
+        base, value = baseline[name]["value"], current[name]["value"]
+        change = (value - base) / base if base else 0.0
+        worse = -change if current[name]["higher_is_better"] else change
+        rows.append((name, base, value, change, worse > threshold))
+    return rows
@@ -0,0 +1,70 @@
+import argparse
+import random
+import timeit
+
+import chess
+import numpy as np
+
+from benchmarks.common import metric
+from chess_environment.encoder import encode_board, encode_boards
+
+
+def loop_encode(board):
+    # Implementação antiga de ChessEnvironment.get_state, mantida como referência
+    state = np.zeros((8, 8, 12), dtype=np.float32)
+    for i in range(64):
+        piece = board.piece_at(i)
+        if piece:
+            color = int(piece.color)
+            piece_type = piece.piece_type - 1
+            state[i // 8, i % 8, piece_type + 6 * color] = 1
+    return state
+
+
+def random_boards(count, max_plies=60, seed=0):
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(count):
+        board = chess.Board()
+        for _ in range(rng.randint(0, max_plies)):
+            if board.is_game_over():
+                break
+            board.push(rng.choice(list(board.legal_moves)))
+        boards.append(board)
+    return boards
+
+
+def run(positions=256, repeat=5):
+    boards = random_boards(positions)
+    for board in boards:
+        assert np.array_equal(loop_encode(board), encode_board(board))
+
+    def best(fn):
+        return min(timeit.repeat(fn, number=1, repeat=repeat)) / len(boards) * 1e6
+
+    return {
+        "encoder.python_loop": metric(best(lambda: [loop_encode(board) for board in boards]), "us/position", False),
+        "encoder.single": metric(best(lambda: [encode_board(board) for board in boards]), "us/position", False),
+        "encoder.batch": metric(best(lambda: encode_boards(boards)), "us/position", False),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the 12-plane observation encoder")
+    parser.add_argument("--positions", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run(args.positions, args.repeat)
+    loop_us = results["encoder.python_loop"]["value"]
+    single_us = results["encoder.single"]["value"]
+    batch_us = results["encoder.batch"]["value"]
+
+    print(f"positions: {args.positions}")
+    print(f"python loop:      {loop_us:8.2f} us/position")
+    print(f"bitboard single:  {single_us:8.2f} us/position ({loop_us / single_us:.1f}x)")
+    print(f"bitboard batch:   {batch_us:8.2f} us/position ({loop_us / batch_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import random
+
+import chess
+
+from benchmarks.common import best_time, metric
+from chess_environment.action_codec import move_to_action
+from chess_environment.chess_env import ChessEnvironment
+
+
+def random_legal_action(env, rng):
+    move = rng.choice(list(env.board.legal_moves))
+    return move_to_action(move)
+
+
+def run(steps=2000, repeat=5, seed=0):
+    env = ChessEnvironment()
+    rng = random.Random(seed)
+
+    # Pré-sorteia as ações para medir só o custo do step
+    env.reset()
+    actions = []
+    for _ in range(steps):
+        action = random_legal_action(env, rng)
+        actions.append(action)
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+
+    def play():
+        env.reset()
+        for action in actions:
+            _, _, done, _ = env.step(action)
+            if done:
+                env.reset()
+
+    step_time = best_time(play, repeat=repeat) / steps
+
+    env.reset()
+    env.set_board(chess.Board("r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5"))
+    state_time = best_time(env.get_state, number=1000, repeat=repeat)
+
+    return {
+        "env.step": metric(1 / step_time, "steps/s", True),
+        "env.get_state": metric(1 / state_time, "calls/s", True),
+    }
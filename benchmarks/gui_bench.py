@@ -0,0 +1,41 @@
+import os
+import random
+import time
+
+import chess
+
+from benchmarks.common import metric
+
+
+def run(frames=200, seed=0):
+    # Sem janela: o driver dummy do SDL permite medir o desenho em qualquer máquina
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from chess_gui import ChessGUI
+
+    pygame.init()
+    gui = ChessGUI(rl_color="White", llm_color="Black")
+    rng = random.Random(seed)
+    board = chess.Board()
+    move_list = []
+
+    idle_times = []
+    move_times = []
+    for i in range(frames):
+        # Um lance a cada 5 quadros; os demais só avançam o relógio
+        moved = i % 5 == 0 and not board.is_game_over()
+        if moved:
+            move = rng.choice(list(board.legal_moves))
+            move_list.append(f"RL: {move.uci()}")
+            gui.set_last_move(move.uci())
+            board.push(move)
+
+        start_time = time.perf_counter()
+        pygame.display.update(gui.update(board, "Thinking...", "Waiting for RL move...", move_list, i / 30))
+        (move_times if moved else idle_times).append(time.perf_counter() - start_time)
+
+    pygame.quit()
+    return {
+        "gui.update.idle": metric(sum(idle_times) / len(idle_times) * 1e3, "ms/frame", False),
+        "gui.update.after_move": metric(sum(move_times) / len(move_times) * 1e3, "ms/frame", False),
+    }
@@ -0,0 +1,92 @@
+import chess
+import numpy as np
+
+# Ações 0-4095: origem * 64 + destino (a promoção para dama fica implícita quando um peão chega à última fileira).
+# Ações 4096-4227: subpromoções (cavalo, bispo, torre) para cada par origem/destino de promoção possível.
+NUM_BASE_ACTIONS = 64 * 64
+UNDERPROMOTIONS = (chess.KNIGHT, chess.BISHOP, chess.ROOK)
+
+
+def _promotion_pairs():
+    pairs = []
+    for from_rank, to_rank in ((6, 7), (1, 0)):  # Brancas da 7ª para a 8ª, pretas da 2ª para a 1ª
+        for from_file in range(8):
+            for to_file in (from_file - 1, from_file, from_file + 1):
+                if 0 <= to_file < 8:
+                    pairs.append((chess.square(from_file, from_rank), chess.square(to_file, to_rank)))
+    return pairs
+
+
+def _build_tables():
+    underpromotions = [(from_square, to_square, promotion)
+                       for from_square, to_square in _promotion_pairs() for promotion in UNDERPROMOTIONS]
+    num_actions = NUM_BASE_ACTIONS + len(underpromotions)
+
+    # Decodificação: ação -> (origem, destino, peça de promoção; 0 = nenhuma ou dama implícita)
+    action_from = np.zeros(num_actions, dtype=np.int64)
+    action_to = np.zeros(num_actions, dtype=np.int64)
+    action_promotion = np.zeros(num_actions, dtype=np.int64)
+    action_from[:NUM_BASE_ACTIONS], action_to[:NUM_BASE_ACTIONS] = np.divmod(np.arange(NUM_BASE_ACTIONS), 64)
+
+    # Codificação: lance empacotado (origem | destino << 6 | promoção << 12) -> ação, -1 se não existir
+    packed_to_action = np.full(64 * 64 * 8, -1, dtype=np.int64)
+    base = np.arange(NUM_BASE_ACTIONS)
+    packed_to_action[action_from[base] | action_to[base] << 6] = base
+    packed_to_action[action_from[base] | action_to[base] << 6 | chess.QUEEN << 12] = base
+
+    for index, (from_square, to_square, promotion) in enumerate(underpromotions):
+        action = NUM_BASE_ACTIONS + index
+        action_from[action], action_to[action], action_promotion[action] = from_square, to_square, promotion
+        packed_to_action[from_square | to_square << 6 | promotion << 12] = action
+    return num_actions, action_from, action_to, action_promotion, packed_to_action
+
+
+NUM_ACTIONS, ACTION_FROM, ACTION_TO, ACTION_PROMOTION, PACKED_TO_ACTION = _build_tables()
+
+
+def _pack(move):
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def encode_moves(moves):
+    packed = np.fromiter((_pack(move) for move in moves), dtype=np.int64)
+    return PACKED_TO_ACTION[packed]
+
+
+def move_to_action(move):
+    return int(PACKED_TO_ACTION[_pack(move)])
+
+
+def decode_actions(actions):
+    # Vetorizado: (origem, destino, promoção) de um array de ações
+    actions = np.asarray(actions, dtype=np.int64)
+    return ACTION_FROM[actions], ACTION_TO[actions], ACTION_PROMOTION[actions]
+
+
+def legal_actions(board):
+    # Uma passada pelo gerador de lances do python-chess; o resto é lookup na tabela
+    return encode_moves(board.generate_legal_moves())
+
+
+def legal_action_mask(board):
+    mask = np.zeros(NUM_ACTIONS, dtype=bool)
+    mask[legal_actions(board)] = True
+    return mask
+
+
+def legal_action_masks(boards):
+    masks = np.zeros((len(boards), NUM_ACTIONS), dtype=bool)
+    for row, board in enumerate(boards):
+        masks[row, legal_actions(board)] = True
+    return masks
+
+
+def action_to_move(action, board):
+    from_square, to_square, promotion = (int(value) for value in decode_actions(action))
+    if not promotion and board.piece_type_at(from_square) == chess.PAWN and chess.square_rank(to_square) in (0, 7):
+        promotion = chess.QUEEN
+    return chess.Move(from_square, to_square, promotion=promotion or None)
+
+
+def actions_to_moves(actions, boards):
+    return [action_to_move(action, board) for action, board in zip(actions, boards)]
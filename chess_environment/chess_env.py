@@ -1,24 +1,81 @@
 import chess
 import gym
 import numpy as np
+import metrics
+from chess_environment.action_codec import NUM_ACTIONS, action_to_move, legal_action_mask
+from chess_environment.encoder import encode_board
+
+def affected_squares(board, move):
+    # Casas que mudam com o lance, calculadas no tabuleiro de antes dele: no máximo quatro (roque)
+    squares = {move.from_square, move.to_square}
+    if board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        kingside = board.is_kingside_castling(move)
+        # Origem da torre: no formato rei x torre (Chess960) é o destino do lance; no e1g1/e1c1, a coluna a ou h
+        if board.rooks & board.occupied_co[board.turn] & chess.BB_SQUARES[move.to_square]:
+            rook_square = move.to_square
+        else:
+            rook_square = chess.square(7 if kingside else 0, rank)
+        # Rei e torre: origem e destino de cada um
+        squares |= {rook_square, chess.square(5 if kingside else 3, rank), chess.square(6 if kingside else 2, rank)}
+    elif board.is_en_passant(move):
+        squares.add(chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square)))
+    return squares
+
 
 class ChessEnvironment(gym.Env):
-    def __init__(self):
+    # A observação fica num buffer persistente atualizado só nas casas que o lance muda.
+    # copy_observations=False devolve views somente-leitura do buffer em vez de cópias.
+    def __init__(self, copy_observations=True):
         super().__init__()
         self.board = chess.Board()
-        self.action_space = gym.spaces.Discrete(64 * 64)  # Simplificado: origem e destino
+        self.action_space = gym.spaces.Discrete(NUM_ACTIONS)  # Origem e destino, mais as subpromoções
         self.observation_space = gym.spaces.Box(low=0, high=1, shape=(8, 8, 12), dtype=np.float32)
+        self.action_mask = legal_action_mask(self.board)
+        self.copy_observations = copy_observations
+        self.observation = encode_board(self.board)
+        self.observation_view = self.observation.view()
+        self.observation_view.flags.writeable = False
 
     def reset(self):
         self.board.reset()
+        self.action_mask = legal_action_mask(self.board)
+        self.observation[:] = encode_board(self.board)
+        return self.get_state()
+
+    def set_board(self, board):
+        # Troca o tabuleiro e recodifica tudo; mexer em self.board diretamente deixa a observação desatualizada
+        self.board = board
+        self.action_mask = legal_action_mask(self.board)
+        self.observation[:] = encode_board(self.board)
+
+    def _refresh_squares(self, squares):
+        for square in squares:
+            cell = self.observation[square // 8, square % 8]
+            cell[:] = 0
+            piece = self.board.piece_at(square)
+            if piece is not None:
+                cell[piece.piece_type - 1 + 6 * piece.color] = 1
+
+    def push(self, move):
+        squares = affected_squares(self.board, move)
+        self.board.push(move)
+        self._refresh_squares(squares)
+        self.action_mask = legal_action_mask(self.board)
+
+    def undo(self):
+        # Desfaz o último lance (board.pop()) e restaura só as casas que ele tinha mudado
+        move = self.board.pop()
+        self._refresh_squares(affected_squares(self.board, move))
+        self.action_mask = legal_action_mask(self.board)
         return self.get_state()
 
     def step(self, action):
-        move = self.action_to_uci(action)
-        if move in self.board.legal_moves:
-            self.board.push(move)
-        else:
-            return self.get_state(), -1, True, {}  # Movimento ilegal
+        metrics.inc("env_steps_total")
+        if not self.action_mask[action]:
+            metrics.inc("env_illegal_actions_total")
+            return self.get_state(), -1, True, {"action_mask": self.action_mask}  # Movimento ilegal
+        self.push(self.action_to_uci(action))
 
         reward = 0
         done = self.board.is_game_over()
@@ -30,22 +87,19 @@ class ChessEnvironment(gym.Env):
             elif result == "0-1":
                 reward = -1
 
-        return self.get_state(), reward, done, {}
+        return self.get_state(), reward, done, {"action_mask": self.action_mask}
 
     def get_state(self):
-        state = np.zeros((8, 8, 12), dtype=np.float32)
-        for i in range(64):
-            piece = self.board.piece_at(i)
-            if piece:
-                color = int(piece.color)
-                piece_type = piece.piece_type - 1
-                state[i // 8, i % 8, piece_type + 6 * color] = 1
-        return state
+        if self.copy_observations:
+            return self.observation.copy()
+        return self.observation_view
+
+    def action_masks(self):
+        # Interface esperada pelo MaskablePPO do sb3-contrib
+        return self.action_mask
 
     def action_to_uci(self, action):
-        from_square = action // 64
-        to_square = action % 64
-        return chess.Move(from_square, to_square)
+        return action_to_move(action, self.board)
 
     def render(self):
         print(self.board)
@@ -0,0 +1,39 @@
+import chess
+import numpy as np
+
+# Mesmo layout de planos de antes: piece_type - 1 + 6 * color (pretas 0-5, brancas 6-11)
+PLANES = [(piece_type, color) for color in (chess.BLACK, chess.WHITE) for piece_type in chess.PIECE_TYPES]
+NUM_PLANES = len(PLANES)
+
+
+def board_bitboards(board):
+    # Um bitboard de 64 bits por plano, direto das máscaras internas do python-chess
+    pieces = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+    black, white = board.occupied_co[chess.BLACK], board.occupied_co[chess.WHITE]
+    return [mask & black for mask in pieces] + [mask & white for mask in pieces]
+
+
+def bitboards_to_planes(bitboards):
+    # (N, 12) uint64 -> (N, 8, 8, 12) float32; o bit i de cada máscara é a casa i (rank = i // 8, file = i % 8)
+    bitboards = np.ascontiguousarray(bitboards, dtype="<u8")
+    n = bitboards.shape[0]
+    bits = np.unpackbits(bitboards.view(np.uint8).reshape(n, NUM_PLANES, 8), axis=-1, bitorder="little")
+    return bits.transpose(0, 2, 1).reshape(n, 8, 8, NUM_PLANES).astype(np.float32)
+
+
+def encode_boards(boards):
+    bitboards = np.array([board_bitboards(board) for board in boards], dtype=np.uint64).reshape(-1, NUM_PLANES)
+    return bitboards_to_planes(bitboards)
+
+
+def encode_board(board):
+    return encode_boards([board])[0]
+
+
+def planes_to_bitboards(planes):
+    # Inverso de bitboards_to_planes: (N, 8, 8, 12) -> (N, 12) uint64, 96 bytes por posição
+    planes = np.asarray(planes)
+    n = planes.shape[0]
+    bits = (planes.reshape(n, 64, NUM_PLANES).transpose(0, 2, 1) > 0).astype(np.uint8)
+    packed = np.packbits(bits, axis=-1, bitorder="little")
+    return np.ascontiguousarray(packed).view("<u8").reshape(n, NUM_PLANES).astype(np.uint64)
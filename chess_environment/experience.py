@@ -0,0 +1,152 @@
+import json
+import os
+
+import numpy as np
+
+from chess_environment.encoder import NUM_PLANES, bitboards_to_planes
+
+# Colunas de cada shard: 96 bytes de bitboards + 8 bytes do resto por posição
+COLUMNS = {
+    "bitboards": (np.uint64, (NUM_PLANES,)),
+    "actions": (np.uint16, ()),
+    "rewards": (np.float32, ()),
+    "outcomes": (np.int8, ()),  # Resultado final da partida do ponto de vista das brancas: 1, 0 ou -1
+    "turns": (np.bool_, ()),  # True quando as brancas estão para jogar
+}
+MANIFEST = "manifest.json"
+DEFAULT_SHARD_SIZE = 1 << 16
+
+
+def outcome_value(result):
+    return {"1-0": 1, "0-1": -1}.get(result, 0)
+
+
+def _read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {"shards": [], "games": 0}
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def _shard_path(directory, name, column):
+    return os.path.join(directory, f"{name}.{column}.npy")
+
+
+class ExperienceWriter:
+    # Store append-only: as posições de uma partida só entram nos shards quando ela termina.
+    # Os shards são .npy mapeados em memória com capacidade fixa; o manifest guarda quantas linhas valem,
+    # então um processo interrompido nunca deixa posições pela metade. Um único writer por diretório.
+    def __init__(self, directory, shard_size=DEFAULT_SHARD_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.manifest = _read_manifest(directory)
+        self.games = {}  # Posições das partidas em andamento, por chave de partida
+        self.shard = None
+        self.shard_entry = None
+        if self.manifest["shards"]:
+            entry = self.manifest["shards"][-1]
+            shard = {column: np.load(_shard_path(directory, entry["name"], column), mmap_mode="r+") for column in COLUMNS}
+            if entry["length"] < len(shard["actions"]):
+                # Continua preenchendo o último shard
+                self.shard, self.shard_entry = shard, entry
+
+    def add(self, bitboards, action, reward=0.0, turn=True, game=0):
+        self.games.setdefault(game, []).append((bitboards, action, reward, turn))
+
+    def discard_game(self, game=0):
+        self.games.pop(game, None)
+
+    def end_game(self, outcome, game=0):
+        rows = self.games.pop(game, [])
+        if not rows:
+            return
+        bitboards, actions, rewards, turns = zip(*rows)
+        columns = {
+            "bitboards": np.array(bitboards, dtype=np.uint64).reshape(-1, NUM_PLANES),
+            "actions": np.array(actions, dtype=np.uint16),
+            "rewards": np.array(rewards, dtype=np.float32),
+            "outcomes": np.full(len(rows), outcome, dtype=np.int8),
+            "turns": np.array(turns, dtype=np.bool_),
+        }
+        written = 0
+        while written < len(rows):
+            if self.shard is None:
+                self._new_shard()
+            start = self.shard_entry["length"]
+            count = min(len(rows) - written, len(self.shard["actions"]) - start)
+            for column, values in columns.items():
+                self.shard[column][start:start + count] = values[written:written + count]
+            self.shard_entry["length"] += count
+            written += count
+            if self.shard_entry["length"] == len(self.shard["actions"]):
+                # Shard cheio no meio da partida: grava só os dados. O manifest espera o fim da partida,
+                # senão apontaria para uma partida pela metade
+                self._flush_data()
+                self.shard = self.shard_entry = None
+        self.manifest["games"] += 1
+        self._flush()
+
+    def _new_shard(self):
+        name = f"shard-{len(self.manifest['shards']):05d}"
+        self.shard = {
+            column: np.lib.format.open_memmap(_shard_path(self.directory, name, column), mode="w+",
+                                              dtype=dtype, shape=(self.shard_size,) + shape)
+            for column, (dtype, shape) in COLUMNS.items()
+        }
+        self.shard_entry = {"name": name, "length": 0}
+        self.manifest["shards"].append(self.shard_entry)
+
+    def _flush_data(self):
+        if self.shard is not None:
+            for values in self.shard.values():
+                values.flush()
+
+    def _flush(self):
+        # Dados primeiro, manifest depois (escrita atômica): o manifest nunca aponta para linhas não gravadas
+        self._flush_data()
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as manifest_file:
+            json.dump(self.manifest, manifest_file)
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        # Partidas não terminadas não têm resultado e são descartadas
+        self.games.clear()
+        self._flush()
+        self.shard = self.shard_entry = None
+
+
+class ExperienceStore:
+    # Leitura em streaming: os shards ficam mapeados em memória e só os batches pedidos são decodificados
+    def __init__(self, directory):
+        self.directory = directory
+        manifest = _read_manifest(directory)
+        self.games = manifest["games"]
+        self.shards = []
+        for entry in manifest["shards"]:
+            if entry["length"] == 0:
+                continue
+            shard = {column: np.load(_shard_path(directory, entry["name"], column), mmap_mode="r") for column in COLUMNS}
+            self.shards.append((shard, entry["length"]))
+
+    def __len__(self):
+        return sum(length for _, length in self.shards)
+
+    def iter_batches(self, batch_size=256, shuffle=True, seed=None):
+        # Embaralha a ordem dos shards e as linhas dentro de cada shard: um shard por vez fica quente na memória
+        rng = np.random.default_rng(seed)
+        shard_order = rng.permutation(len(self.shards)) if shuffle else range(len(self.shards))
+        for shard_index in shard_order:
+            shard, length = self.shards[shard_index]
+            rows = rng.permutation(length) if shuffle else np.arange(length)
+            for start in range(0, length, batch_size):
+                batch = np.sort(rows[start:start + batch_size])  # Índices ordenados leem o memmap sequencialmente
+                yield {
+                    "observations": bitboards_to_planes(shard["bitboards"][batch]),
+                    "actions": shard["actions"][batch].astype(np.int64),
+                    "rewards": shard["rewards"][batch],
+                    "outcomes": shard["outcomes"][batch],
+                    "turns": shard["turns"][batch],
+                }
@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+import chess
+import chess.polyglot
+
+from chess_environment.action_codec import encode_moves
+
+ANALYSIS_CACHE_SIZE = 4096
+
+
+class PositionAnalysis:
+    # Tudo o que os consumidores de uma posição precisam, calculado uma vez por lance:
+    # lances legais e suas strings UCI já na criação; capturas, xeques e ações do codec na primeira consulta
+    def __init__(self, board, key=None):
+        self.key = key if key is not None else chess.polyglot.zobrist_hash(board)
+        self.board = board.copy(stack=False)  # Cópia sem histórico: o chamador pode continuar mexendo no dele
+        self.turn = board.turn
+        self.legal_moves = list(board.generate_legal_moves())
+        self.legal_ucis = [move.uci() for move in self.legal_moves]
+        self.legal_uci_set = frozenset(self.legal_ucis)
+        # Peças de cada tipo em jogo, por cor (sem o rei)
+        self.material = {
+            color: {chess.piece_symbol(piece_type): chess.popcount(board.pieces_mask(piece_type, color))
+                    for piece_type in chess.PIECE_TYPES if piece_type != chess.KING}
+            for color in chess.COLORS
+        }
+
+    @cached_property
+    def captures(self):
+        return [self.board.is_capture(move) for move in self.legal_moves]
+
+    @cached_property
+    def checks(self):
+        return [self.board.gives_check(move) for move in self.legal_moves]
+
+    @cached_property
+    def legal_actions(self):
+        return encode_moves(self.legal_moves)
+
+    def is_legal_uci(self, move_uci):
+        return move_uci in self.legal_uci_set
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def analyze(board):
+    # Memoizado pelo hash Zobrist: GUI, prompt, fallback e RL dividem a mesma análise da posição
+    key = chess.polyglot.zobrist_hash(board)
+    with _cache_lock:
+        analysis = _cache.get(key)
+        if analysis is not None:
+            _cache.move_to_end(key)
+            return analysis
+    analysis = PositionAnalysis(board, key)
+    with _cache_lock:
+        _cache[key] = analysis
+        if len(_cache) > ANALYSIS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return analysis
@@ -0,0 +1,214 @@
+import bisect
+import itertools
+import multiprocessing
+import os
+
+import gymnasium
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+import metrics
+from chess_environment.chess_env import ChessEnvironment
+
+
+def gymnasium_space(space):
+    # O ChessEnvironment usa os espaços do gym antigo; o SB3 2.x só aceita os do gymnasium
+    # (o DummyVecEnv converte o env inteiro pelo shimmy, os VecEnvs daqui convertem só os espaços)
+    if isinstance(space, (gymnasium.spaces.Discrete, gymnasium.spaces.Box)):
+        return space
+    if hasattr(space, "n"):
+        return gymnasium.spaces.Discrete(space.n)
+    return gymnasium.spaces.Box(low=space.low, high=space.high, dtype=space.dtype)
+
+
+class ChessVecEnv(VecEnv):
+    # N tabuleiros avançados juntos no mesmo processo, sem o overhead do DummyVecEnv
+    def __init__(self, num_envs):
+        # Os envs devolvem views do buffer de observação: a cópia acontece uma vez, em self.observations
+        self.envs = [ChessEnvironment(copy_observations=False) for _ in range(num_envs)]
+        env = self.envs[0]
+        super().__init__(num_envs, gymnasium_space(env.observation_space), gymnasium_space(env.action_space))
+        self.observations = np.zeros((num_envs,) + env.observation_space.shape, dtype=np.float32)
+        self.rewards = np.zeros(num_envs, dtype=np.float32)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.actions = None
+
+    def reset(self):
+        for i, env in enumerate(self.envs):
+            self.observations[i] = env.reset()
+        return self.observations.copy()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        infos = []
+        for i, env in enumerate(self.envs):
+            obs, reward, done, info = env.step(int(self.actions[i]))
+            if done:
+                # Mesmo contrato do DummyVecEnv: guarda a observação final e reinicia o tabuleiro
+                info["terminal_observation"] = obs.copy()  # O reset sobrescreve o buffer da view
+                obs = env.reset()
+            self.observations[i] = obs
+            self.rewards[i] = reward
+            self.dones[i] = done
+            infos.append(info)
+        return self.observations.copy(), self.rewards.copy(), self.dones.copy(), infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+    def seed(self, seed=None):
+        # O ambiente de xadrez é determinístico
+        return [seed for _ in self.envs]
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(env, attr_name) for env in self._get_target_envs(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        for env in self._get_target_envs(indices):
+            setattr(env, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [getattr(env, method_name)(*method_args, **method_kwargs) for env in self._get_target_envs(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [isinstance(env, wrapper_class) for env in self._get_target_envs(indices)]
+
+    def _get_target_envs(self, indices):
+        if indices is None:
+            indices = range(self.num_envs)
+        elif isinstance(indices, int):
+            indices = [indices]
+        return [self.envs[i] for i in indices]
+
+
+def _slice_worker(remote, parent_remote, num_envs):
+    # Processo filho: um ChessVecEnv com a fatia de tabuleiros, comandado pelo pipe
+    parent_remote.close()
+    env = ChessVecEnv(num_envs)
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                env.step_async(data)
+                # Os contadores do env (env_steps_total...) vão junto: o registro deste processo nunca é exportado
+                remote.send((env.step_wait(), metrics.registry.drain()))
+            elif command == "reset":
+                remote.send(env.reset())
+            elif command == "spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif command == "call":
+                # get_attr, set_attr, env_method e env_is_wrapped do ChessVecEnv, com índices locais.
+                # O erro volta para o processo principal: has_attr depende do AttributeError
+                method_name, args, kwargs = data
+                try:
+                    remote.send(getattr(env, method_name)(*args, **kwargs))
+                except Exception as error:
+                    remote.send(error)
+            elif command == "close":
+                env.close()
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remote.close()
+
+
+class SubprocChessVecEnv(VecEnv):
+    # n_workers processos, cada um avançando uma fatia de n_envs // n_workers tabuleiros num ChessVecEnv:
+    # uma troca de mensagens por worker a cada passo, em vez de uma por tabuleiro como no SubprocVecEnv
+    def __init__(self, n_envs, n_workers, start_method=None):
+        n_workers = max(1, min(n_workers, n_envs))
+        sizes = [n_envs // n_workers + (i < n_envs % n_workers) for i in range(n_workers)]
+        self.offsets = list(itertools.accumulate(sizes, initial=0))
+        if start_method is None:
+            # Mesmo padrão do SubprocVecEnv: fork não é seguro com o PyTorch já carregado
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(start_method)
+        self.remotes, work_remotes = zip(*[context.Pipe() for _ in range(n_workers)])
+        self.processes = []
+        for remote, work_remote, size in zip(self.remotes, work_remotes, sizes):
+            process = context.Process(target=_slice_worker, args=(work_remote, remote, size), daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+        self.remotes[0].send(("spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+        super().__init__(n_envs, observation_space, action_space)
+        self.closed = False
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        return np.concatenate([remote.recv() for remote in self.remotes])
+
+    def step_async(self, actions):
+        actions = np.asarray(actions).reshape(self.num_envs)
+        for remote, start, end in zip(self.remotes, self.offsets, self.offsets[1:]):
+            remote.send(("step", actions[start:end]))
+
+    def step_wait(self):
+        results = []
+        for remote in self.remotes:
+            result, state = remote.recv()
+            metrics.registry.merge(state)
+            results.append(result)
+        observations, rewards, dones, infos = zip(*results)
+        return (np.concatenate(observations), np.concatenate(rewards), np.concatenate(dones),
+                [info for worker_infos in infos for info in worker_infos])
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def seed(self, seed=None):
+        # O ambiente de xadrez é determinístico
+        return [seed for _ in range(self.num_envs)]
+
+    def get_attr(self, attr_name, indices=None):
+        return self._call("get_attr", indices, attr_name)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._call("set_attr", indices, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._call("env_method", indices, method_name, *method_args, **method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return self._call("env_is_wrapped", indices, wrapper_class)
+
+    def _call(self, method_name, indices, *args, **kwargs):
+        # Agrupa os índices globais por worker e devolve os resultados na ordem pedida
+        if indices is None:
+            indices = range(self.num_envs)
+        elif isinstance(indices, int):
+            indices = [indices]
+        workers = [bisect.bisect_right(self.offsets, index) - 1 for index in indices]
+        local = {}
+        for index, worker in zip(indices, workers):
+            local.setdefault(worker, []).append(index - self.offsets[worker])
+        for worker, worker_indices in local.items():
+            self.remotes[worker].send(("call", (method_name, args, {**kwargs, "indices": worker_indices})))
+        # Lê todas as respostas antes de levantar um erro, para nenhum pipe ficar com mensagem pendente
+        results = {worker: self.remotes[worker].recv() for worker in local}
+        for result in results.values():
+            if isinstance(result, Exception):
+                raise result
+        if method_name == "set_attr":
+            return None
+        results = {worker: iter(result) for worker, result in results.items()}
+        return [next(results[worker]) for worker in workers]
+
+
+def make_chess_vec_env(n_envs=1, use_subprocess=False, start_method=None, n_workers=None):
+    # Com use_subprocess os tabuleiros são divididos entre n_workers processos (padrão: um por CPU)
+    if use_subprocess:
+        return SubprocChessVecEnv(n_envs, n_workers or os.cpu_count() or 1, start_method=start_method)
+    return ChessVecEnv(n_envs)
@@ -1,6 +1,23 @@
+import math
+from collections import OrderedDict
+
 import chess
 import pygame
 
+from chess_environment.position import analyze
+
+
+def load_piece_images(size):
+    pieces = ['p', 'n', 'b', 'r', 'q', 'k']
+    colors = ['b', 'w']
+    images = {}
+    for color in colors:
+        for piece in pieces:
+            filename = f"{color}{piece}.png"
+            img = pygame.image.load(f"chess_pieces/{filename}")
+            images[f"{color}{piece}"] = pygame.transform.scale(img, (size, size))
+    return images
+
 
 class ChessGUI:
     def __init__(self, width=1200, height=800, rl_color=None, llm_color=None):
@@ -30,6 +47,7 @@ class ChessGUI:
         self.piece_images = self._load_piece_images()
         self.small_piece_images = self._load_piece_images(size=self.square_size // 2)
         self.last_move = None
+        self.last_move_squares = ()
 
         # Colors
         self.bg_color = (240, 240, 240)
@@ -54,53 +72,30 @@ class ChessGUI:
         self.white_captures = 0
         self.black_captures = 0
 
-    def _load_piece_images(self, size=None):
-        if size is None:
-            size = self.square_size
-        pieces = ['p', 'n', 'b', 'r', 'q', 'k']
-        colors = ['b', 'w']
-        images = {}
-        for color in colors:
-            for piece in pieces:
-                filename = f"{color}{piece}.png"
-                img = pygame.image.load(f"chess_pieces/{filename}")
-                images[f"{color}{piece}"] = pygame.transform.scale(img, (size, size))
-        return images
-
-    def update(self, board, rl_info, llm_info, move_list, game_time):
-        self.screen.fill(self.bg_color)
-        
-        # Draw chess board
-        self._draw_board(board)
-        
-        # Update captured pieces count
-        self.white_pieces, self.black_pieces = self._update_captured_pieces(board)
-        
-        # Draw RL info
-        self.rl_surface.fill(self.bg_color)
-        self._draw_agent_info(self.rl_surface, f"RL Agent ({self.rl_color})", rl_info, move_list)
-        self._draw_captured_pieces_info(self.rl_surface, self.rl_color)
-        self.screen.blit(self.rl_surface, (0, 0))
-        
-        # Draw LLM info
-        self.llm_surface.fill(self.bg_color)
-        self._draw_agent_info(self.llm_surface, f"LLM Agent ({self.llm_color})", llm_info, move_list)
-        self._draw_captured_pieces_info(self.llm_surface, self.llm_color)
-        self._draw_text(self.llm_surface, f"Game time: {game_time:.1f}s", (10, self.height - 100), self.text_color)
-        self.screen.blit(self.llm_surface, (self.width * 2 // 3, 0))
-
-        # Draw borders
-        pygame.draw.line(self.screen, self.border_color, (self.width // 3, 0), (self.width // 3, self.height), 2)
-        pygame.draw.line(self.screen, self.border_color, (self.width * 2 // 3, 0), (self.width * 2 // 3, self.height), 2)
-
-        # Draw Quit button
-        pygame.draw.rect(self.screen, (200, 50, 50), self.quit_button)
-        quit_text = self.font.render("Quit", True, (255, 255, 255))
-        self.screen.blit(quit_text, (self.quit_button.centerx - quit_text.get_width() // 2, self.quit_button.centery - quit_text.get_height() // 2))
-
-    def _draw_board(self, board):
-        # Draw border around the board
-        pygame.draw.rect(self.screen, self.border_color, (
+        # Camadas pré-renderizadas e estado do último quadro, para redesenhar só o que mudou
+        self.text_cache = OrderedDict()
+        self.text_cache_size = 512
+        self.background = self._render_background()
+        self.rl_panel_rect = pygame.Rect(0, 0, width // 3, height)
+        self.llm_panel_rect = pygame.Rect(width * 2 // 3, 0, width // 3, height)
+        self.game_time_rect = pygame.Rect(self.llm_panel_rect.x + 10, height - 100, width // 3 - 20, 30)
+        self.invalidate()
+
+    def invalidate(self):
+        # Força um redesenho completo no próximo update (ex.: depois da tela inicial)
+        self.full_redraw = True
+        self.drawn_pieces = {}
+        self.drawn_highlight = ()
+        self.drawn_rl_panel = None
+        self.drawn_llm_panel = None
+        self.drawn_game_time = None
+
+    def _render_background(self):
+        # Fundo, casas, borda e coordenadas nunca mudam: são desenhados uma única vez
+        background = pygame.Surface((self.width, self.height))
+        background.fill(self.bg_color)
+
+        pygame.draw.rect(background, self.border_color, (
             self.board_pos[0] - 2, self.board_pos[1] - 2,
             self.board_size + 4, self.board_size + 4
         ), 2)
@@ -110,31 +105,137 @@ class ChessGUI:
                 color = self.light_square if (row + col) % 2 == 0 else self.dark_square
                 x = self.board_pos[0] + col * self.square_size
                 y = self.board_pos[1] + row * self.square_size
-                pygame.draw.rect(self.screen, color, (x, y, self.square_size, self.square_size))
-
-                # Highlight last move
-                if self.last_move:
-                    from_square = chess.parse_square(self.last_move[:2])
-                    to_square = chess.parse_square(self.last_move[2:4])
-                    if (7-row, col) in [(from_square // 8, from_square % 8), (to_square // 8, to_square % 8)]:
-                        pygame.draw.rect(self.screen, self.highlight_color, (x, y, self.square_size, self.square_size))
+                pygame.draw.rect(background, color, (x, y, self.square_size, self.square_size))
 
-                piece = board.piece_at(chess.square(col, 7 - row))
-                if piece:
-                    piece_image = self.piece_images[f"{'w' if piece.color else 'b'}{piece.symbol().lower()}"]
-                    self.screen.blit(piece_image, (x, y))
-
-        # Draw coordinates
         for i in range(8):
             # Files (A-H)
             text = self.small_font.render(chess.FILE_NAMES[i], True, self.text_color)
             x = self.board_pos[0] + i * self.square_size + self.square_size // 2 - text.get_width() // 2
-            self.screen.blit(text, (x, self.board_pos[1] + self.board_size + 5))
+            background.blit(text, (x, self.board_pos[1] + self.board_size + 5))
 
             # Ranks (1-8)
             text = self.small_font.render(str(8 - i), True, self.text_color)
             y = self.board_pos[1] + i * self.square_size + self.square_size // 2 - text.get_height() // 2
-            self.screen.blit(text, (self.board_pos[0] - 20, y))
+            background.blit(text, (self.board_pos[0] - 20, y))
+
+        return background
+
+    def _render_text(self, text, font, color):
+        key = (text, id(font), color)
+        surface = self.text_cache.get(key)
+        if surface is None:
+            surface = font.render(text, True, color)
+            self.text_cache[key] = surface
+            if len(self.text_cache) > self.text_cache_size:
+                self.text_cache.popitem(last=False)
+        else:
+            self.text_cache.move_to_end(key)
+        return surface
+
+    def _load_piece_images(self, size=None):
+        return load_piece_images(size or self.square_size)
+
+    def update(self, board, rl_info, llm_info, move_list, game_time):
+        # Redesenha só as casas e painéis que mudaram; devolve os retângulos para pygame.display.update
+        full = self.full_redraw
+        dirty = []
+        if full:
+            self.screen.blit(self.background, (0, 0))
+            dirty.append(self.screen.get_rect())
+
+        board_changed, board_rects = self._draw_board(board, full)
+        dirty.extend(board_rects)
+
+        # Update captured pieces count
+        if board_changed:
+            self.white_pieces, self.black_pieces = self._update_captured_pieces(board)
+
+        history = tuple(move_list[-15:])
+        captures = (self.white_captures, self.black_captures, tuple(self.white_pieces.values()), tuple(self.black_pieces.values()))
+
+        # Draw RL info
+        rl_panel = (rl_info, history, len(move_list), captures)
+        if full or rl_panel != self.drawn_rl_panel:
+            self.rl_surface.fill(self.bg_color)
+            self._draw_agent_info(self.rl_surface, f"RL Agent ({self.rl_color})", rl_info, move_list)
+            self._draw_captured_pieces_info(self.rl_surface, self.rl_color)
+            self.screen.blit(self.rl_surface, self.rl_panel_rect)
+            self._draw_borders()
+            self.drawn_rl_panel = rl_panel
+            dirty.append(self.rl_panel_rect)
+
+        # Draw LLM info
+        llm_panel = (llm_info, history, len(move_list), captures)
+        game_time_text = f"Game time: {game_time:.1f}s"
+        if full or llm_panel != self.drawn_llm_panel:
+            self.llm_surface.fill(self.bg_color)
+            self._draw_agent_info(self.llm_surface, f"LLM Agent ({self.llm_color})", llm_info, move_list)
+            self._draw_captured_pieces_info(self.llm_surface, self.llm_color)
+            self.screen.blit(self.llm_surface, self.llm_panel_rect)
+            self._draw_borders()
+            self._draw_quit_button()
+            self.drawn_llm_panel = llm_panel
+            self.drawn_game_time = None
+            dirty.append(self.llm_panel_rect)
+
+        if game_time_text != self.drawn_game_time:
+            self.screen.fill(self.bg_color, self.game_time_rect)
+            self._draw_text(self.screen, game_time_text, self.game_time_rect.topleft, self.text_color)
+            self.drawn_game_time = game_time_text
+            dirty.append(self.game_time_rect)
+
+        self.full_redraw = False
+        return dirty
+
+    def _draw_borders(self):
+        pygame.draw.line(self.screen, self.border_color, (self.width // 3, 0), (self.width // 3, self.height), 2)
+        pygame.draw.line(self.screen, self.border_color, (self.width * 2 // 3, 0), (self.width * 2 // 3, self.height), 2)
+
+    def _draw_quit_button(self):
+        pygame.draw.rect(self.screen, (200, 50, 50), self.quit_button)
+        quit_text = self._render_text("Quit", self.font, (255, 255, 255))
+        self.screen.blit(quit_text, (self.quit_button.centerx - quit_text.get_width() // 2, self.quit_button.centery - quit_text.get_height() // 2))
+
+    def _square_rect(self, square):
+        col = chess.square_file(square)
+        row = 7 - chess.square_rank(square)
+        return pygame.Rect(
+            self.board_pos[0] + col * self.square_size,
+            self.board_pos[1] + row * self.square_size,
+            self.square_size, self.square_size,
+        )
+
+    def _draw_board(self, board, full=False):
+        pieces = board.piece_map()
+        highlight = self.last_move_squares
+        if full:
+            squares = chess.SQUARES
+        else:
+            squares = [
+                square for square in chess.SQUARES
+                if pieces.get(square) != self.drawn_pieces.get(square)
+                or (square in highlight) != (square in self.drawn_highlight)
+            ]
+
+        rects = []
+        for square in squares:
+            rect = self._square_rect(square)
+            self.screen.blit(self.background, rect, rect)
+
+            # Highlight last move
+            if square in highlight:
+                pygame.draw.rect(self.screen, self.highlight_color, rect)
+
+            piece = pieces.get(square)
+            if piece:
+                piece_image = self.piece_images[f"{'w' if piece.color else 'b'}{piece.symbol().lower()}"]
+                self.screen.blit(piece_image, rect)
+            rects.append(rect)
+
+        board_changed = full or pieces != self.drawn_pieces
+        self.drawn_pieces = pieces
+        self.drawn_highlight = highlight
+        return board_changed, rects
 
     def _draw_agent_info(self, surface, agent_name, info, move_list):
         pygame.draw.rect(surface, (220, 220, 220), (10, 10, self.width // 3 - 20, 50), border_radius=10)
@@ -149,7 +250,7 @@ class ChessGUI:
             start_index = max(0, len(move_list) - 15)  # Start from the last 15 moves or from the beginning if less than 15
             for i, move in enumerate(move_list[start_index:]):
                 move_number = start_index + i + 1
-                text = self.small_font.render(f"{move_number}. {move}", True, self.text_color)
+                text = self._render_text(f"{move_number}. {move}", self.small_font, self.text_color)
                 surface.blit(text, (30, 220 + i * 25))
 
     def _draw_text(self, surface, text, pos, color, font=None, max_width=None):
@@ -160,8 +261,8 @@ class ChessGUI:
         current_line = []
         for word in words:
             test_line = ' '.join(current_line + [word])
-            test_surface = font.render(test_line, True, color)
-            if max_width and test_surface.get_width() > max_width:
+            # font.size mede a linha sem criar uma surface
+            if max_width and font.size(test_line)[0] > max_width:
                 if current_line:
                     lines.append(' '.join(current_line))
                     current_line = [word]
@@ -173,13 +274,17 @@ class ChessGUI:
             lines.append(' '.join(current_line))
         
         for i, line in enumerate(lines):
-            text_surface = font.render(line, True, color)
+            text_surface = self._render_text(line, font, color)
             surface.blit(text_surface, (pos[0], pos[1] + i * 30))
 
     def set_last_move(self, move):
         self.last_move = move
+        # Casas de origem e destino calculadas uma vez, não a cada quadro
+        self.last_move_squares = (chess.parse_square(move[:2]), chess.parse_square(move[2:4])) if move else ()
 
-    def show_start_screen(self):
+    def show_start_screen(self, loading_status=None):
+        # loading_status: função opcional que devolve (texto, progresso 0..1) do carregamento em segundo plano
+        self.invalidate()
         self.screen.fill(self.bg_color)
         title = self.large_font.render("Chess: RL vs LLM", True, self.text_color)
         self.screen.blit(title, (self.width // 2 - title.get_width() // 2, 100))
@@ -214,8 +319,16 @@ class ChessGUI:
 
         pygame.display.flip()
 
+        drawn_status = None
         waiting = True
         while waiting:
+            if loading_status is not None:
+                status = loading_status()
+                if status != drawn_status:
+                    pygame.display.update(self._draw_loading_status(*status))
+                    drawn_status = status
+            self.clock.tick(30)
+
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     return None, None
@@ -245,6 +358,17 @@ class ChessGUI:
 
         return None, None
 
+    def _draw_loading_status(self, text, progress):
+        area = pygame.Rect(self.width // 2 - 150, 570, 300, 50)
+        pygame.draw.rect(self.screen, self.bg_color, area)
+        status_text = self._render_text(text, self.small_font, self.text_color)
+        self.screen.blit(status_text, (area.centerx - status_text.get_width() // 2, area.y))
+
+        bar = pygame.Rect(area.x, area.y + 25, area.width, 12)
+        pygame.draw.rect(self.screen, self.border_color, bar, 1)
+        pygame.draw.rect(self.screen, self.dark_square, (bar.x + 1, bar.y + 1, int((bar.width - 2) * progress), bar.height - 2))
+        return area
+
     def check_quit(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
             if self.quit_button.collidepoint(event.pos):
@@ -252,14 +376,11 @@ class ChessGUI:
         return False
 
     def _update_captured_pieces(self, board):
-        white_pieces = {'p': 8, 'n': 2, 'b': 2, 'r': 2, 'q': 1}
-        black_pieces = {'p': 8, 'n': 2, 'b': 2, 'r': 2, 'q': 1}
-
-        for piece_type in chess.PIECE_TYPES:
-            if piece_type != chess.KING:
-                symbol = chess.piece_symbol(piece_type)
-                white_pieces[symbol] -= len(board.pieces(piece_type, chess.WHITE))
-                black_pieces[symbol] -= len(board.pieces(piece_type, chess.BLACK))
+        # Contagem de material da análise da posição, a mesma usada pelos agentes neste lance
+        material = analyze(board).material
+        starting = {'p': 8, 'n': 2, 'b': 2, 'r': 2, 'q': 1}
+        white_pieces = {symbol: count - material[chess.WHITE][symbol] for symbol, count in starting.items()}
+        black_pieces = {symbol: count - material[chess.BLACK][symbol] for symbol, count in starting.items()}
 
         self.white_captures = sum(black_pieces.values())
         self.black_captures = sum(white_pieces.values())
@@ -271,7 +392,7 @@ class ChessGUI:
         opponent_pieces = self.black_captures if color == 'White' else self.white_captures
 
         text = f"Captured pieces: {captured}"
-        text_surface = self.font.render(text, True, self.text_color)
+        text_surface = self._render_text(text, self.font, self.text_color)
         surface.blit(text_surface, (10, self.height - 70))
 
         # Add information about opponent's captured pieces
@@ -282,5 +403,107 @@ class ChessGUI:
             if count > 0:
                 opponent_pieces_text += f"{piece_symbols[piece]}:{count} "
 
-        opponent_text_surface = self.small_font.render(opponent_pieces_text, True, self.text_color)
-        surface.blit(opponent_text_surface, (10, self.height - 40))
\ No newline at end of file
+        opponent_text_surface = self._render_text(opponent_pieces_text, self.small_font, self.text_color)
+        surface.blit(opponent_text_surface, (10, self.height - 40))
+
+
+class SpectatorGUI:
+    # Vários tabuleiros pequenos numa janela só. Não tem laço próprio: quem chama aplica os eventos das partidas
+    # e chama draw() a cada quadro, que redesenha apenas os tabuleiros que mudaram desde o quadro anterior
+    def __init__(self, tiles, width=1200, height=800):
+        pygame.init()
+        pygame.display.set_icon(pygame.image.load("icon.png"))
+        self.width = width
+        self.height = height
+        self.screen = pygame.display.set_mode((width, height))
+        pygame.display.set_caption("Chess: RL vs LLM - spectator")
+        self.clock = pygame.time.Clock()
+        self.small_font = pygame.font.Font(None, 20)
+
+        self.bg_color = (240, 240, 240)
+        self.text_color = (50, 50, 50)
+        self.highlight_color = (255, 255, 0, 128)
+        self.light_square = (234, 235, 200)
+        self.dark_square = (119, 154, 88)
+        self.border_color = (100, 100, 100)
+
+        # Grade quase quadrada: 4 tabuleiros em 2x2, 6 em 3x2, 9 em 3x3...
+        self.columns = math.ceil(math.sqrt(tiles))
+        rows = math.ceil(tiles / self.columns)
+        self.tile_width = width // self.columns
+        self.tile_height = height // rows
+        self.header_height = 40
+        self.square_size = max(4, (min(self.tile_width, self.tile_height - self.header_height) - 16) // 8)
+        self.board_size = self.square_size * 8
+
+        self.piece_images = load_piece_images(self.square_size)
+        self.board_surface = self._render_board()
+        self.tiles = [{"board": chess.Board(), "title": "Waiting for a game...", "status": "", "last_move": (),
+                       "dirty": True} for _ in range(tiles)]
+        self.screen.fill(self.bg_color)
+        pygame.display.flip()
+
+    def _render_board(self):
+        surface = pygame.Surface((self.board_size, self.board_size))
+        for row in range(8):
+            for col in range(8):
+                color = self.light_square if (row + col) % 2 == 0 else self.dark_square
+                pygame.draw.rect(surface, color, (col * self.square_size, row * self.square_size,
+                                                  self.square_size, self.square_size))
+        return surface
+
+    def tile_rect(self, tile):
+        return pygame.Rect((tile % self.columns) * self.tile_width, (tile // self.columns) * self.tile_height,
+                           self.tile_width, self.tile_height)
+
+    def start_game(self, tile, game_index, rl_white):
+        state = self.tiles[tile]
+        state["board"] = chess.Board()
+        state["title"] = f"Game {game_index + 1}: RL ({'White' if rl_white else 'Black'}) vs LLM"
+        state["status"] = "Starting..."
+        state["last_move"] = ()
+        state["dirty"] = True
+
+    def push_move(self, tile, move_uci, agent):
+        state = self.tiles[tile]
+        move = chess.Move.from_uci(move_uci)
+        state["board"].push(move)
+        state["status"] = f"Ply {len(state['board'].move_stack)}: {agent} {move_uci}"
+        state["last_move"] = (move.from_square, move.to_square)
+        state["dirty"] = True
+
+    def end_game(self, tile, result, termination):
+        state = self.tiles[tile]
+        state["status"] = f"{result} ({termination.replace('_', ' ')}) after {len(state['board'].move_stack)} plies"
+        state["dirty"] = True
+
+    def draw(self):
+        # Devolve os retângulos alterados para pygame.display.update
+        dirty = []
+        for tile, state in enumerate(self.tiles):
+            if state["dirty"]:
+                dirty.append(self._draw_tile(tile, state))
+                state["dirty"] = False
+        return dirty
+
+    def _draw_tile(self, tile, state):
+        rect = self.tile_rect(tile)
+        self.screen.fill(self.bg_color, rect)
+        pygame.draw.rect(self.screen, self.border_color, rect, 1)
+        self.screen.blit(self.small_font.render(state["title"], True, self.text_color), (rect.x + 8, rect.y + 4))
+        self.screen.blit(self.small_font.render(state["status"], True, self.text_color), (rect.x + 8, rect.y + 22))
+
+        board_x = rect.x + (rect.width - self.board_size) // 2
+        board_y = rect.y + self.header_height + (rect.height - self.header_height - self.board_size) // 2
+        self.screen.blit(self.board_surface, (board_x, board_y))
+        for square in state["last_move"]:
+            pygame.draw.rect(self.screen, self.highlight_color, self._square_rect(square, board_x, board_y))
+        for square, piece in state["board"].piece_map().items():
+            piece_image = self.piece_images[f"{'w' if piece.color else 'b'}{piece.symbol().lower()}"]
+            self.screen.blit(piece_image, self._square_rect(square, board_x, board_y))
+        return rect
+
+    def _square_rect(self, square, board_x, board_y):
+        return pygame.Rect(board_x + chess.square_file(square) * self.square_size,
+                           board_y + (7 - chess.square_rank(square)) * self.square_size,
+                           self.square_size, self.square_size)
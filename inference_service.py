@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+
+class BatchedInferenceService:
+    # Junta pedidos de várias partidas concorrentes e os executa como um único forward em batch.
+    # batch_fn recebe uma lista de entradas e devolve uma lista de resultados na mesma ordem.
+    # Com cost e max_batch_cost o batch também é limitado pela soma dos custos (ex.: linhas que cada entrada gera)
+    def __init__(self, batch_fn, max_batch_size=32, max_wait=0.005, name="inference-service", cost=None, max_batch_cost=None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.cost = cost
+        self.max_batch_cost = max_batch_cost
+        self.carry = None  # Pedido que não coube no batch anterior e abre o próximo
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self.busy_time = 0.0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        if self.closed:
+            raise RuntimeError("inference service is closed")
+        future = Future()
+        self.requests.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _cost(self, request):
+        return self.cost(request[0]) if self.cost is not None else 1
+
+    def _collect(self):
+        first, self.carry = (self.carry if self.carry is not None else self.requests.get()), None
+        if first is None:
+            return None
+        batch = [first]
+        batch_cost = self._cost(first)
+        # Espera no máximo max_wait por mais pedidos antes de rodar um batch incompleto
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Processa o que já chegou e encerra na próxima volta
+                self.requests.put(None)
+                break
+            request_cost = self._cost(request)
+            if self.max_batch_cost is not None and batch_cost + request_cost > self.max_batch_cost:
+                self.carry = request
+                break
+            batch.append(request)
+            batch_cost += request_cost
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            start_time = time.perf_counter()
+            try:
+                with metrics.thread_profile():
+                    results = self.batch_fn([item for item, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            self.busy_time += time.perf_counter() - start_time
+            self.batches += 1
+            self.items += len(batch)
+            if len(results) != len(batch):
+                # Sem isso os pedidos sem resultado esperariam para sempre no result()
+                error = RuntimeError(f"batch_fn returned {len(results)} results for {len(batch)} inputs")
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "busy_time": self.busy_time,
+        }
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.requests.put(None)
+            self.thread.join()
@@ -0,0 +1,153 @@
+import importlib.util
+import json
+import os
+import resource
+import sys
+
+import numpy as np
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+from transformers.modeling_utils import no_init_weights
+from transformers.utils import cached_file
+
+# eager: fp32 do PyTorch; int8: quantização dinâmica das camadas lineares; onnx: ONNX Runtime via optimum
+BACKENDS = ("eager", "int8", "onnx")
+ARTIFACT_DIR = "llm_artifacts"
+SAFETENSORS_DTYPES = {"F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+                      "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+                      "BOOL": torch.bool}
+
+
+def resident_memory_mb():
+    # RSS atual via /proc; None fora do Linux, onde só há o pico (peak_memory_mb)
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return None
+
+
+def peak_memory_mb():
+    # Pico de RSS do processo: getrusage devolve bytes no macOS e KB no Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def memory_label():
+    rss = resident_memory_mb()
+    return f"RSS {rss:.0f} MB" if rss is not None else f"peak RSS {peak_memory_mb():.0f} MB"
+
+
+def memory_usage_mb():
+    # RSS conta as páginas compartilhadas (copy-on-write) em todos os processos; PSS as divide entre eles
+    # e USS conta só as páginas privadas, que é o custo real de um worker a mais
+    rss = resident_memory_mb()
+    if rss is None:
+        return {"peak_rss": peak_memory_mb()}
+    usage = {"rss": rss}
+    kb = {}
+    try:
+        with open("/proc/self/smaps_rollup") as smaps:
+            for line in smaps:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    kb[name] = int(value.split()[0])
+    except OSError:
+        return usage
+    usage["pss"] = kb.get("Pss", 0) / 1024
+    usage["uss"] = (kb.get("Private_Clean", 0) + kb.get("Private_Dirty", 0)) / 1024
+    return usage
+
+
+def conv1d_to_linear(module):
+    # GPT-2 usa Conv1D (pesos transpostos), que o quantize_dynamic não reconhece
+    from transformers.pytorch_utils import Conv1D
+
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            conv1d_to_linear(child)
+    return module
+
+
+def _installed(module_name):
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except ModuleNotFoundError:  # Pacote pai ausente
+        return False
+
+
+def backend_dependency_error(backend):
+    # Mensagem para o parser.error quando falta a dependência opcional do backend; None se ela está instalada
+    if backend == "onnx" and not all(_installed(name) for name in ("optimum.onnxruntime", "onnxruntime")):
+        return "--llm-backend onnx requires optimum[onnxruntime] (pip install 'optimum[onnxruntime]')"
+    return None
+
+
+def export_onnx(model_name, artifact_dir=ARTIFACT_DIR):
+    # A exportação é lenta, então o modelo exportado fica em disco para as próximas execuções
+    if error := backend_dependency_error("onnx"):
+        raise ImportError(error)
+    from optimum.onnxruntime import ORTModelForCausalLM
+
+    path = os.path.join(artifact_dir, model_name.replace("/", "--") + "-onnx")
+    if os.path.isdir(path):
+        return ORTModelForCausalLM.from_pretrained(path)
+    model = ORTModelForCausalLM.from_pretrained(model_name, export=True)
+    model.save_pretrained(path)
+    return model
+
+
+def mmap_safetensors(path):
+    # Tensores que apontam direto para o arquivo (mmap privado, copy-on-write): nada é copiado na carga e as
+    # páginas ficam no page cache, divididas entre o processo pai, os workers do fork e outras execuções
+    with open(path, "rb") as weights_file:
+        header_len = int.from_bytes(weights_file.read(8), "little")
+        header = json.loads(weights_file.read(header_len))
+    data = np.memmap(path, dtype=np.uint8, mode="c", offset=8 + header_len)
+    state = {}
+    for name, info in header.items():
+        if name != "__metadata__":
+            begin, end = info["data_offsets"]
+            tensor = torch.from_numpy(data[begin:end]).view(SAFETENSORS_DTYPES[info["dtype"]])
+            state[name] = tensor.reshape(info["shape"])
+    return state
+
+
+def load_gpt2(model_name):
+    try:
+        state = mmap_safetensors(cached_file(model_name, "model.safetensors"))
+    except (OSError, ValueError):
+        # Checkpoint só em .bin: carga normal, com os pesos copiados para a memória do processo
+        return GPT2LMHeadModel.from_pretrained(model_name)
+    # Sem inicialização: os parâmetros são torch.empty, que não chegam a ocupar memória antes de serem trocados
+    with no_init_weights():
+        model = GPT2LMHeadModel(GPT2Config.from_pretrained(model_name))
+    # Checkpoints antigos do hub salvam o GPT2Model sem o prefixo "transformer."
+    expected = model.state_dict().keys()
+    state = {name if name in expected else f"transformer.{name}": tensor for name, tensor in state.items()}
+    missing, _ = model.load_state_dict(state, strict=False, assign=True)
+    # lm_head é amarrado aos embeddings
+    model.tie_weights()
+    if set(missing) - {"lm_head.weight"}:
+        raise ValueError(f"{model_name}: weights missing from model.safetensors: {sorted(missing)}")
+    return model
+
+
+def load_model(model_name, backend="eager", artifact_dir=ARTIFACT_DIR):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {backend!r}, expected one of {BACKENDS}")
+
+    if backend == "onnx":
+        return export_onnx(model_name, artifact_dir)
+
+    model = load_gpt2(model_name)
+    model.eval()
+    if backend == "int8":
+        model = torch.ao.quantization.quantize_dynamic(conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8)
+    return model
@@ -0,0 +1,17 @@
+import random
+
+from chess_environment.position import analyze
+
+
+def fallback_move(board):
+    # Política de emergência sem modelo: prefere xeques, depois capturas, depois qualquer lance legal
+    analysis = analyze(board)
+    legal_moves = analysis.legal_moves
+    captures = [move for move, capture in zip(legal_moves, analysis.captures) if capture]
+    checks = [move for move, check in zip(legal_moves, analysis.checks) if check]
+    if checks:
+        return random.choice(checks)
+    elif captures:
+        return random.choice(captures)
+    else:
+        return random.choice(legal_moves)
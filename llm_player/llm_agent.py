@@ -1,79 +1,394 @@
 import chess
-import random
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
+import threading
+import time
+from transformers import GPT2Tokenizer, StoppingCriteria, StoppingCriteriaList
 import torch
 import re
+import metrics
+from chess_environment.position import analyze
+from llm_player.backends import load_model, memory_label
+from llm_player.fallback import fallback_move
+from llm_player.move_cache import MoveCache, position_key
+
+# Parte fixa do prompt: vem primeiro para que seus past-key-values possam ser reaproveitados
+PROMPT_PREFIX = "Choose the best move from the legal moves. Respond with only the UCI notation of the chosen move (e.g., e2e4).\n"
+
+# Teto de memória das ativações (logits + cache expandido) de cada forward de pontuação
+SCORE_MEMORY_MB = 512
+
+
+def expand_cache(past, batch_size):
+    # Cache novo cujas chaves e valores são views (expand) do original: nada é copiado aqui,
+    # e o forward estende o cache novo sem tocar no original
+    legacy = past if isinstance(past, tuple) else past.to_legacy_cache()
+    expanded = tuple(tuple(t.expand(batch_size, *t.shape[1:]) for t in layer) for layer in legacy)
+    return expanded if isinstance(past, tuple) else type(past).from_legacy_cache(expanded)
+
+
+def token_log_probs(logits, targets, valid):
+    # Soma das log-probabilidades dos tokens alvo; logit - logsumexp evita materializar o log_softmax do vocabulário
+    logits = logits.float()
+    target_logits = logits.gather(-1, targets.unsqueeze(-1)).squeeze(-1)
+    return ((target_logits - torch.logsumexp(logits, dim=-1)) * valid).sum(dim=-1)
+
+
+class MoveTimeout(Exception):
+    pass
+
+class StopOnDeadline(StoppingCriteria):
+    # Interrompe o generate quando o tempo do lance acaba ou o jogo é fechado
+    def __init__(self, deadline=None, cancel_event=None):
+        self.deadline = deadline
+        self.cancel_event = cancel_event
+
+    def expired(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return True
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.expired(), dtype=torch.bool)
 
 class SimpleLLM:
-    def __init__(self):
-        self.tokenizer = GPT2Tokenizer.from_pretrained("gpt2-large")
-        self.model = GPT2LMHeadModel.from_pretrained("gpt2-large")
+    # mode="score": pontua todos os lances legais de uma vez; mode="sample": gera texto e tenta de novo
+    # backend: "eager" (fp32), "int8" (quantização dinâmica) ou "onnx" (ONNX Runtime, exportado uma vez para disco)
+    def __init__(self, mode="score", backend="eager", model_name="gpt2-large"):
+        self.tokenizer = GPT2Tokenizer.from_pretrained(model_name)
+        self.model = load_model(model_name, backend)
         self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.mode = mode
+        self.backend = backend
+
+        # O prefixo é tokenizado e codificado uma única vez
+        self.prefix_ids = self.tokenizer.encode(PROMPT_PREFIX, return_tensors="pt")
+        self.prefix_past = None
+        if backend != "onnx":
+            # O ONNX Runtime gerencia o próprio cache; lá o prefixo passa pelo modelo a cada lance
+            with torch.inference_mode():
+                self.prefix_past = self.model(self.prefix_ids, use_cache=True).past_key_values
+
+    def build_prompt(self, board, analysis):
+        # Apenas a parte variável do prompt; PROMPT_PREFIX já está no cache
+        prompt = f"Chess FEN: {board.fen()}\n"
+        prompt += f"Legal moves: {' '.join(analysis.legal_ucis)}\n"
+        prompt += "Move:"
+        return prompt
+
+    def prefix_cache(self, batch_size=1):
+        # Cópia do cache do prefixo (generate e forward estendem o cache recebido)
+        return expand_cache(self.prefix_past, batch_size)
 
     def clean_move(self, move_string):
         match = re.search(r'\b[a-h][1-8][a-h][1-8][qrbn]?\b', move_string.lower())
         return match.group(0) if match else ""
 
     def fallback_move(self, board):
-        legal_moves = list(board.legal_moves)
-        captures = [move for move in legal_moves if board.is_capture(move)]
-        checks = [move for move in legal_moves if board.gives_check(move)]
-        if checks:
-            return random.choice(checks)
-        elif captures:
-            return random.choice(captures)
+        return fallback_move(board)
+
+    def score_moves(self, board, analysis, stop=None):
+        # Log-probabilidade de cada lance legal como continuação do prompt
+        return self.score_positions([(board, analysis)], stop)[0]
+
+    def score_positions(self, positions, stop=None):
+        # Pontua os lances legais de várias posições (board, PositionAnalysis), uma posição por vez:
+        # o sufixo do prompt passa pelo modelo uma única vez (batch 1) e só os tokens dos lances rodam em batch.
+        # stop (StopOnDeadline) é consultado entre os blocos de linhas e interrompe com MoveTimeout
+        with torch.inference_mode():
+            return [self._score_position(board, analysis, stop) for board, analysis in positions]
+
+    def _score_position(self, board, analysis, stop=None):
+        prompt_ids = self.tokenizer.encode(self.build_prompt(board, analysis))
+        moves = [self.tokenizer.encode(" " + move_uci) for move_uci in analysis.legal_ucis]
+        context_len = self.prefix_ids.shape[1] + len(prompt_ids)
+        if self.prefix_past is not None:
+            # Prefixo (em cache) + sufixo: só o logit do último token é calculado, ele prevê o 1º token do lance
+            output = self.model(
+                torch.tensor([prompt_ids]),
+                attention_mask=torch.ones((1, context_len), dtype=torch.long),
+                past_key_values=self.prefix_cache(),
+                use_cache=True,
+                logits_to_keep=1,
+            )
+            context = output.past_key_values
+            first_log_probs = torch.log_softmax(output.logits[0, -1].float(), dim=-1)
+            score_rows = lambda rows: self._score_continuations(context, context_len, first_log_probs, rows)
         else:
-            return random.choice(legal_moves)
+            # Sem cache (ONNX): cada linha leva o prompt inteiro, então os blocos de linhas são menores
+            context_ids = self.prefix_ids[0].tolist() + prompt_ids
+            score_rows = lambda rows: self._score_full_rows(context_ids, rows)
 
-    def generate_move(self, board, max_attempts=5):
-        legal_moves = list(board.legal_moves)
-        
-        for attempt in range(max_attempts):
-            prompt = f"Chess FEN: {board.fen()}\n"
-            prompt += f"Legal moves: {' '.join([move.uci() for move in legal_moves])}\n"
-            prompt += "Choose the best move from the legal moves. Respond with only the UCI notation of the chosen move (e.g., e2e4):"
-            
-            input_ids = self.tokenizer.encode(prompt, return_tensors="pt")
-            attention_mask = input_ids.ne(self.tokenizer.pad_token_id).float()
+        # Blocos de linhas limitados por SCORE_MEMORY_MB: o uso de memória não depende do número de lances
+        chunk = self._rows_per_chunk(context_len, max(len(ids) for ids in moves), cached=self.prefix_past is not None)
+        scores = []
+        for start in range(0, len(moves), chunk):
+            if stop is not None and stop.expired():
+                raise MoveTimeout()
+            scores.append(score_rows(moves[start:start + chunk]))
+        return torch.cat(scores)
+
+    def _rows_per_chunk(self, context_len, move_len, cached):
+        config = self.model.config
+        logits_bytes = (move_len if cached else context_len + move_len) * config.vocab_size * 4
+        # Com cache, cada linha carrega chaves e valores de todas as camadas; o cache concatenado e a cópia
+        # de trabalho da atenção dobram esse valor no pico (medido)
+        kv_bytes = 2 * 2 * config.n_layer * config.n_embd * (context_len + move_len) * 4 if cached else 0
+        return max(1, SCORE_MEMORY_MB * 2**20 // (logits_bytes + kv_bytes))
+
+    def _pad_moves(self, rows):
+        width = max(len(ids) for ids in rows)
+        targets = torch.full((len(rows), width), self.tokenizer.pad_token_id, dtype=torch.long)
+        valid = torch.zeros((len(rows), width), dtype=torch.bool)
+        for i, ids in enumerate(rows):
+            targets[i, :len(ids)] = torch.tensor(ids)
+            valid[i, :len(ids)] = True
+        return targets, valid
+
+    def _score_continuations(self, context, context_len, first_log_probs, rows):
+        # O cache do contexto (batch 1) é expandido para as linhas sem cópia; cada linha recebe só os tokens do lance
+        targets, valid = self._pad_moves(rows)
+        scores = first_log_probs[targets[:, 0]]
+        if targets.shape[1] > 1:
+            # O último token de cada lance só é previsto, nunca alimentado
+            inputs = targets[:, :-1]
+            attention_mask = torch.cat([torch.ones((len(rows), context_len), dtype=torch.long), valid[:, :-1].long()], dim=1)
+            logits = self.model(
+                inputs,
+                attention_mask=attention_mask,
+                past_key_values=expand_cache(context, len(rows)),
+                use_cache=True,
+            ).logits
+            scores = scores + token_log_probs(logits, targets[:, 1:], valid[:, 1:])
+        return scores
+
+    def _score_full_rows(self, context_ids, rows):
+        targets, valid = self._pad_moves(rows)
+        input_ids = torch.cat([torch.tensor([context_ids]).expand(len(rows), -1), targets], dim=1)
+        attention_mask = torch.cat([torch.ones((len(rows), len(context_ids)), dtype=torch.long), valid.long()], dim=1)
+        logits = self.model(input_ids, attention_mask=attention_mask).logits
+        # O logit da posição t prevê o token t + 1: só as posições que preveem tokens de lance interessam
+        start = len(context_ids) - 1
+        return token_log_probs(logits[:, start:start + targets.shape[1]], targets, valid)
+
+    def best_moves(self, boards):
+        # Melhor lance legal de cada tabuleiro, todos pontuados juntos (usado pelo serviço de inferência em batch)
+        positions = [(board, analyze(board)) for board in boards]
+        best = []
+        for (board, analysis), scores in zip(positions, self.score_positions(positions)):
+            index = int(scores.argmax())
+            best.append((analysis.legal_moves[index], float(scores[index])))
+        return best
+
+    def generate_move(self, board, max_attempts=5, deadline=None, cancel_event=None, stats=None):
+        # Levanta MoveTimeout se o prazo (time.monotonic) expirar ou cancel_event for acionado.
+        # O pondering chama em paralelo com o lance da vez: nada da chamada fica em self; stats (dict opcional)
+        # recebe as tentativas (forwards/gerações) e a latência desta chamada
+        start_time = time.perf_counter()
+        with torch.inference_mode():
+            move, thoughts, attempts = self._generate_move(board, max_attempts, deadline, cancel_event)
+        latency = time.perf_counter() - start_time
+        if stats is not None:
+            stats.update(attempts=attempts, latency=latency)
+        metrics.observe("llm_generate_seconds", latency, mode=self.mode, backend=self.backend)
+        metrics.inc("llm_attempts_total", attempts, mode=self.mode)
+        thoughts += f"\nBackend {self.backend}: {latency:.2f}s, {memory_label()}."
+        return move, thoughts
+
+    def _generate_move(self, board, max_attempts, deadline, cancel_event):
+        # Lances legais e UCI vêm da análise da posição, feita uma vez por lance e dividida com GUI, RL e fallback
+        analysis = analyze(board)
+        legal_moves = analysis.legal_moves
+        prefix_len = self.prefix_ids.shape[1] if self.prefix_past is not None else 0
+        stop = StopOnDeadline(deadline, cancel_event)
 
+        if self.mode == "score":
+            if stop.expired():
+                raise MoveTimeout()
+            scores = self.score_moves(board, analysis, stop)
+            best = int(scores.argmax())
+            thoughts = f"Scored {len(legal_moves)} legal moves over one prompt pass. Best: {legal_moves[best].uci()} (log-prob {scores[best]:.2f})."
+            thoughts += f"\nPrefix cache saved {prefix_len} tokens this move."
+            return legal_moves[best], thoughts, 1
+
+        # O sufixo não muda entre tentativas, então é tokenizado uma vez por lance
+        prompt_ids = self.tokenizer.encode(self.build_prompt(board, analysis), return_tensors="pt")
+        input_ids = torch.cat([self.prefix_ids, prompt_ids], dim=1)
+        attention_mask = torch.ones_like(input_ids)
+
+        for attempt in range(max_attempts):
+            if stop.expired():
+                raise MoveTimeout()
             outputs = self.model.generate(
                 input_ids,
                 attention_mask=attention_mask,
+                past_key_values=self.prefix_cache() if self.prefix_past is not None else None,
                 max_new_tokens=5,
                 num_return_sequences=1,
                 do_sample=True,
                 temperature=0.7,
-                pad_token_id=self.tokenizer.eos_token_id
+                pad_token_id=self.tokenizer.eos_token_id,
+                stopping_criteria=StoppingCriteriaList([stop])
             )
-            suggested_move = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+            if stop.expired():
+                raise MoveTimeout()
+            # Decodifica só os tokens novos; o prompt contém lances de exemplo
+            suggested_move = self.tokenizer.decode(outputs[0, input_ids.shape[1]:], skip_special_tokens=True)
             suggested_move = self.clean_move(suggested_move)
+            tokens_saved = f"\nPrefix cache saved {prefix_len * (attempt + 1)} tokens this move."
 
-            if suggested_move:
-                try:
-                    move = chess.Move.from_uci(suggested_move)
-                    if move in legal_moves:
-                        return move, f"Valid move {suggested_move} generated on attempt {attempt + 1}."
-                except ValueError:
-                    pass
+            if suggested_move and analysis.is_legal_uci(suggested_move):
+                thoughts = f"Valid move {suggested_move} generated on attempt {attempt + 1}." + tokens_saved
+                return chess.Move.from_uci(suggested_move), thoughts, attempt + 1
         
+        metrics.inc("llm_fallbacks_total", reason="invalid_output")
         chosen_move = self.fallback_move(board)
-        thoughts = f"Failed to generate a valid move after {max_attempts} attempts. Using fallback strategy."
-        return chosen_move, thoughts
+        thoughts = f"Failed to generate a valid move after {max_attempts} attempts. Using fallback strategy." + tokens_saved
+        return chosen_move, thoughts, max_attempts
 
 class LLMAgent:
-    def __init__(self):
-        self.move_cache = {}
-        self.llm = SimpleLLM()
+    def __init__(self, mode="score", cache_size=10000, cache_path=None, verbose=True, backend="eager"):
+        self.move_cache = MoveCache(max_size=cache_size, path=cache_path)
+        self.llm = SimpleLLM(mode=mode, backend=backend)
+        self.verbose = verbose
+        # Pondering: posições calculadas durante a vez do adversário (chave -> segundos gastos)
+        self.ponder_thread = None
+        self.ponder_cancel = None  # Interrompe inclusive o cálculo em andamento
+        self.ponder_finish = None  # Deixa terminar a posição atual e para
+        self.ponder_position = None
+        self.ponder_wait = 0.0
+        self.pondered = {}
+        self.ponder_lock = threading.Lock()
+        self.ponder_positions = 0
+        self.ponder_turns = 0
+        self.ponder_hits = 0
+        self.ponder_time_saved = 0.0
+
+    def get_actions(self, states):
+        # Versão em batch para o modo score: consulta o cache e pontua todas as posições restantes num único forward
+        boards = [chess.Board(state) for state in states]
+        moves = [None] * len(boards)
+        pending = {}
+        for i, board in enumerate(boards):
+            cached = self.move_cache.get(board)
+            if cached and analyze(board).is_legal_uci(cached):
+                moves[i] = cached
+            else:
+                # Posições repetidas no mesmo batch são pontuadas uma vez só
+                pending.setdefault(position_key(board), []).append(i)
+
+        if pending:
+            indices = list(pending.values())
+            for same_position, (move, _) in zip(indices, self.llm.best_moves([boards[group[0]] for group in indices])):
+                for i in same_position:
+                    moves[i] = move.uci()
+                self.move_cache.put(boards[same_position[0]], move.uci())
+        return moves
 
-    def get_action(self, state, timeout=1):
-        if state in self.move_cache:
-            return self.move_cache[state]
+    def start_pondering(self, board, replies):
+        # Enquanto o adversário pensa, calcula em segundo plano a resposta a cada uma das jogadas prováveis dele
+        self.stop_pondering()
+        with self.ponder_lock:
+            self.pondered.clear()  # Respostas calculadas para lances anteriores não servem mais
+        self.ponder_cancel = threading.Event()
+        self.ponder_finish = threading.Event()
+        self.ponder_thread = threading.Thread(target=self._ponder, args=(board.copy(), list(replies), self.ponder_cancel, self.ponder_finish),
+                                              name="llm-ponder", daemon=True)
+        self.ponder_thread.start()
 
+    def stop_pondering(self, board=None):
+        # Se a posição em cálculo é exatamente a pedida, espera terminar em vez de jogar o trabalho fora
+        self.ponder_wait = 0.0
+        if self.ponder_thread is None:
+            return
+        with self.ponder_lock:
+            needed = board is not None and self.ponder_position == position_key(board)
+        if needed:
+            self.ponder_finish.set()
+            start_time = time.perf_counter()
+            self.ponder_thread.join()
+            self.ponder_wait = time.perf_counter() - start_time
+        # Num miss não há join: o cálculo descartado para sozinho no próximo bloco de linhas (ou token, no modo sample).
+        # O evento de cancelamento é o token da geração: acionado sob o lock, a thread antiga não escreve mais nada
+        with self.ponder_lock:
+            self.ponder_cancel.set()
+        self.ponder_thread = None
+
+    def _ponder(self, board, replies, cancel_event, finish_event):
+        for reply in replies:
+            if cancel_event.is_set() or finish_event.is_set():
+                return
+            position = board.copy()
+            position.push_uci(reply)
+            if position.is_game_over() or self.move_cache.contains(position):
+                continue
+            key = position_key(position)
+            with self.ponder_lock:
+                if cancel_event.is_set():
+                    return
+                self.ponder_position = key
+            start_time = time.perf_counter()
+            try:
+                with metrics.thread_profile():
+                    chosen_move, _ = self.llm.generate_move(position, cancel_event=cancel_event)
+            except MoveTimeout:
+                return
+            finally:
+                with self.ponder_lock:
+                    # Uma thread cancelada sem join não apaga a posição de quem a substituiu
+                    if self.ponder_position == key:
+                        self.ponder_position = None
+            # O lance calculado vale mesmo se o pondering já foi cancelado; só não conta como resposta pronta dele
+            self.move_cache.put(position, chosen_move.uci())
+            with self.ponder_lock:
+                if cancel_event.is_set():
+                    return
+                self.pondered[key] = time.perf_counter() - start_time
+                self.ponder_positions += 1
+            metrics.inc("llm_ponder_positions_total")
+
+    def ponder_stats(self):
+        with self.ponder_lock:
+            return {
+                "pondered": self.ponder_positions,
+                "turns": self.ponder_turns,
+                "hits": self.ponder_hits,
+                "hit_rate": self.ponder_hits / self.ponder_turns if self.ponder_turns else 0.0,
+                "time_saved": self.ponder_time_saved,
+            }
+
+    def get_action(self, state, timeout=None, cancel_event=None):
         board = chess.Board(state)
-        chosen_move, thoughts = self.llm.generate_move(board)
+        self.stop_pondering(board)
+        cached = self.move_cache.get(board)
+        with self.ponder_lock:
+            self.ponder_turns += 1
+            ponder_seconds = self.pondered.pop(position_key(board), None)
+        # Confere a legalidade para não confiar cegamente numa colisão de hash
+        if cached and analyze(board).is_legal_uci(cached):
+            if ponder_seconds is not None:
+                # Se foi preciso esperar o fim do cálculo, só o tempo já adiantado conta como economia
+                saved = max(0.0, ponder_seconds - self.ponder_wait)
+                with self.ponder_lock:
+                    self.ponder_hits += 1
+                    self.ponder_time_saved += saved
+                metrics.inc("llm_ponder_hits_total")
+                if self.verbose:
+                    print(f"Ponder hit: {cached} was computed during the opponent's turn ({saved:.2f}s saved)")
+            return cached
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            chosen_move, thoughts = self.llm.generate_move(board, deadline=deadline, cancel_event=cancel_event)
+        except MoveTimeout:
+            metrics.inc("llm_fallbacks_total", reason="timeout")
+            # Lance de emergência não vai para o cache
+            chosen_move = self.llm.fallback_move(board)
+            if self.verbose:
+                print(f"LLM ran out of time, using fallback move {chosen_move.uci()}")
+            return chosen_move.uci()
 
         move_uci = chosen_move.uci()
-        self.move_cache[state] = move_uci
+        self.move_cache.put(board, move_uci)
         
-        print(f"LLM thoughts:\n{thoughts}")
+        if self.verbose:
+            print(f"LLM thoughts:\n{thoughts}")
         return move_uci
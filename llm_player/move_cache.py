@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import chess.polyglot
+
+import metrics
+
+
+def position_key(board):
+    # Hash Zobrist (Polyglot): transposições com contadores de lance diferentes caem na mesma chave
+    return chess.polyglot.zobrist_hash(board)
+
+
+def _to_sql_key(key):
+    # INTEGER do SQLite é de 64 bits com sinal
+    return key - (1 << 64) if key >= (1 << 63) else key
+
+
+class MoveCache:
+    # LRU limitado em memória, com cópia opcional em SQLite para aquecer execuções futuras
+    def __init__(self, max_size=10000, path=None):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS moves (key INTEGER PRIMARY KEY, move TEXT NOT NULL, used REAL NOT NULL)")
+            rows = self.db.execute("SELECT key, move FROM moves ORDER BY used DESC LIMIT ?", (max_size,)).fetchall()
+            # Os mais recentes ficam no fim do OrderedDict, como no uso normal
+            for key, move in reversed(rows):
+                self.entries[key % (1 << 64)] = move
+
+    def get(self, board):
+        key = position_key(board)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("llm_cache_hits_total", tier="memory")
+                return self.entries[key]
+
+            if self.db is not None:
+                row = self.db.execute("SELECT move FROM moves WHERE key = ?", (_to_sql_key(key),)).fetchone()
+                if row:
+                    self.disk_hits += 1
+                    metrics.inc("llm_cache_hits_total", tier="disk")
+                    # Renova o uso no disco também: o aquecimento da próxima execução segue a ordem do LRU
+                    self.db.execute("UPDATE moves SET used = ? WHERE key = ?", (time.time(), _to_sql_key(key)))
+                    self.db.commit()
+                    self._insert(key, row[0])
+                    return row[0]
+
+            self.misses += 1
+            metrics.inc("llm_cache_misses_total")
+            return None
+
+    def contains(self, board):
+        # Consulta sem mexer na ordem do LRU nem nas estatísticas (usada pelo pondering)
+        key = position_key(board)
+        with self.lock:
+            if key in self.entries:
+                return True
+            if self.db is not None:
+                return self.db.execute("SELECT 1 FROM moves WHERE key = ?", (_to_sql_key(key),)).fetchone() is not None
+            return False
+
+    def put(self, board, move):
+        key = position_key(board)
+        with self.lock:
+            self._insert(key, move)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO moves (key, move, used) VALUES (?, ?, ?)",
+                    (_to_sql_key(key), move, time.time()),
+                )
+                self.db.commit()
+
+    def _insert(self, key, move):
+        self.entries[key] = move
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+            metrics.inc("llm_cache_evictions_total")
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,114 @@
+import os
+import time
+
+import chess
+import chess.polyglot
+import chess.syzygy
+
+import metrics
+
+
+class LookupStats:
+    # Contagem por partida: lances vindos do livro/tablebase versus lances calculados pelo modelo
+    def __init__(self):
+        self.hits = {"book": 0, "tablebase": 0}
+        self.hit_seconds = 0.0
+        self.model_moves = 0
+        self.model_seconds = 0.0
+
+    def record(self, source, seconds):
+        if source == "model":
+            self.model_moves += 1
+            self.model_seconds += seconds
+        else:
+            self.hits[source] += 1
+            self.hit_seconds += seconds
+
+    def to_dict(self):
+        hits = sum(self.hits.values())
+        moves = hits + self.model_moves
+        # Tempo economizado estimado pela latência média do modelo nos lances desta partida
+        mean_model_latency = self.model_seconds / self.model_moves if self.model_moves else 0.0
+        return {
+            "moves": moves,
+            "book_hits": self.hits["book"],
+            "tablebase_hits": self.hits["tablebase"],
+            "hit_rate": hits / moves if moves else 0.0,
+            "time_saved": max(0.0, hits * mean_model_latency - self.hit_seconds),
+        }
+
+
+class MoveLookup:
+    # Livro de aberturas Polyglot e tablebases Syzygy locais, consultados antes dos modelos.
+    # Os leitores do python-chess mapeiam os arquivos em memória e ficam abertos até close().
+    def __init__(self, book_path=None, tablebase_dir=None):
+        self.book = None
+        self.tablebase = None
+        self.max_pieces = 0
+        if book_path and os.path.exists(book_path):
+            self.book = chess.polyglot.open_reader(book_path)
+            print(f"Opening book loaded from {book_path}")
+        if tablebase_dir and os.path.isdir(tablebase_dir):
+            self.tablebase = chess.syzygy.open_tablebase(tablebase_dir)
+            # Nomes das tabelas como "KQvK": o número de peças é o de letras, fora o "v"
+            self.max_pieces = max((len(name) - 1 for name in self.tablebase.wdl), default=0)
+            print(f"Syzygy tablebases loaded from {tablebase_dir} (up to {self.max_pieces} pieces)")
+
+    def book_move(self, board):
+        if self.book is None:
+            return None
+        try:
+            move = self.book.weighted_choice(board).move
+        except IndexError:
+            return None
+        return move if board.is_legal(move) else None
+
+    def tablebase_move(self, board):
+        # Escolhe o lance com o melhor WDL; entre vitórias, o que zera o DTZ mais rápido
+        if self.tablebase is None or board.castling_rights or chess.popcount(board.occupied) > self.max_pieces:
+            return None
+        board = board.copy(stack=False)
+        best_move, best_rank = None, None
+        for move in list(board.legal_moves):
+            board.push(move)
+            try:
+                wdl = -self.tablebase.probe_wdl(board)
+                dtz = abs(self.tablebase.probe_dtz(board))
+            except KeyError:
+                return None  # Tabela ausente para esta combinação de peças
+            finally:
+                board.pop()
+            rank = (-wdl, dtz if wdl > 0 else -dtz)
+            if best_rank is None or rank < best_rank:
+                best_move, best_rank = move, rank
+        return best_move
+
+    def probe(self, board):
+        move = self.book_move(board)
+        if move is not None:
+            return move, "book"
+        move = self.tablebase_move(board)
+        if move is not None:
+            return move, "tablebase"
+        return None, None
+
+    def choose(self, board, compute_move, stats=None, agent=None):
+        # compute_move(board) -> UCI só roda quando nenhuma das tabelas tem o lance
+        start_time = time.perf_counter()
+        move, source = self.probe(board)
+        if move is not None:
+            move_uci = move.uci()
+            metrics.inc("lookup_hits_total", source=source, agent=agent)
+        else:
+            move_uci = compute_move(board)
+            source = "model"
+            metrics.inc("lookup_misses_total", agent=agent)
+        if stats is not None:
+            stats.record(source, time.perf_counter() - start_time)
+        return move_uci, source
+
+    def close(self):
+        if self.book is not None:
+            self.book.close()
+        if self.tablebase is not None:
+            self.tablebase.close()
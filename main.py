@@ -1,27 +1,138 @@
-from chess_environment.chess_env import ChessEnvironment
-from llm_player.llm_agent import LLMAgent
-from rl_player.rl_agent import RLAgent
-from chess_gui import ChessGUI
-import pygame
 import time
+_import_start = time.perf_counter()
+import argparse
+import contextlib
+import pygame
 import chess
 import threading
 from queue import Queue
 import random
 import os
-from stable_baselines3 import PPO  # Adicione esta linha
+from chess_gui import ChessGUI
+from chess_environment.action_codec import move_to_action
+from chess_environment.encoder import board_bitboards
+from chess_environment.experience import ExperienceWriter, outcome_value
+from lookup import LookupStats, MoveLookup
+import metrics
+# stable_baselines3, torch e transformers são importados só na thread de carregamento dos modelos
+_import_time = time.perf_counter() - _import_start
+
+MOVE_TIME_BUDGET = 30  # Segundos por lance antes de usar o lance de emergência
+VISUALIZATION_DELAY = 1  # Pausa após cada lance, sem bloquear a janela
+MODEL_PATH = "rl_model.zip"
+PONDER_REPLIES = 3  # Lances mais prováveis do RL para os quais o LLM calcula a resposta durante a vez do RL
+
+class StartupProfiler:
+	def __init__(self, enabled=False, origin=None):
+		self.enabled = enabled
+		self.origin = origin if origin is not None else time.perf_counter()
+		self.phases = []
+		self.lock = threading.Lock()
+
+	def record(self, name, started, duration):
+		with self.lock:
+			self.phases.append((name, started - self.origin, duration, threading.current_thread().name))
+
+	@contextlib.contextmanager
+	def phase(self, name):
+		started = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.record(name, started, time.perf_counter() - started)
+
+	def report(self):
+		if not self.enabled:
+			return
+		print("Startup profile (seconds):")
+		for name, offset, duration, thread in sorted(self.phases, key=lambda phase: phase[1]):
+			print(f"  {name:<30} {duration:8.3f}  (at {offset:7.3f}, {thread})")
+		print(f"  {'total':<30} {time.perf_counter() - self.origin:8.3f}")
+
+class ModelLoader(threading.Thread):
+	# Importa as bibliotecas pesadas e carrega os dois modelos enquanto a tela inicial é exibida
+	def __init__(self, profiler, llm_backend="eager"):
+		super().__init__(name="model-loader", daemon=True)
+		self.profiler = profiler
+		self.llm_backend = llm_backend
+		self.status = "Loading models..."
+		self.progress = 0.0
+		self.llm_player = None
+		self.rl_player = None
+		self.error = None
+
+	def run(self):
+		try:
+			self.status, self.progress = "Importing RL libraries...", 0.05
+			with self.profiler.phase("import RL agent"):
+				from chess_environment.chess_env import ChessEnvironment
+				from rl_player.rl_agent import RLAgent
+
+			self.status, self.progress = "Importing transformers...", 0.2
+			with self.profiler.phase("import LLM agent"):
+				from llm_player.llm_agent import LLMAgent
+
+			self.status, self.progress = "Loading LLM weights...", 0.35
+			with self.profiler.phase("load LLM model"):
+				self.llm_player = LLMAgent(cache_path="llm_move_cache.db", backend=self.llm_backend)
+
+			self.status, self.progress = "Loading RL model...", 0.85
+			with self.profiler.phase("load RL model"):
+				self.rl_player = RLAgent(ChessEnvironment())
+				if os.path.exists(MODEL_PATH):
+					print("Loading pre-trained RL model...")
+					self.rl_player.load(MODEL_PATH)
+
+			self.status, self.progress = "Models ready", 1.0
+		except Exception as error:
+			self.error = error
+			self.status = f"Loading failed: {error}"
 
-def get_llm_move(llm_player, board, result_queue):
-	llm_action = llm_player.get_action(board.fen())
+	def loading_status(self):
+		return self.status, self.progress
+
+def get_llm_move(llm_player, board, result_queue, cancel_event, lookup, stats):
+	def compute_move(board):
+		return llm_player.get_action(board.fen(), timeout=MOVE_TIME_BUDGET, cancel_event=cancel_event)
+	with metrics.thread_profile(), metrics.timer("move_seconds", agent="LLM"):
+		llm_action, _ = lookup.choose(board, compute_move, stats, agent="LLM")
 	result_queue.put(llm_action)
 
+def get_rl_move(rl_player, board, result_queue, lookup, stats):
+	with metrics.thread_profile(), metrics.timer("move_seconds", agent="RL"):
+		rl_action, _ = lookup.choose(board, rl_player.get_action, stats, agent="RL")
+	result_queue.put(rl_action)
+
 def main():
+	parser = argparse.ArgumentParser(description="Chess: RL vs LLM")
+	parser.add_argument("--profile-startup", action="store_true", help="report per-phase import and model load times")
+	parser.add_argument("--llm-backend", default="eager", choices=["eager", "int8", "onnx"], help="LLM inference backend")
+	parser.add_argument("--opening-book", default="book.bin", help="Polyglot opening book consulted before both agents")
+	parser.add_argument("--tablebase", default="syzygy", help="directory with Syzygy tablebases consulted before both agents")
+	parser.add_argument("--no-ponder", action="store_true", help="don't precompute LLM replies during the RL agent's turn")
+	parser.add_argument("--experience-dir", default="experience", help="append finished games to this experience store (empty to disable)")
+	metrics.add_cli_arguments(parser)
+	args = parser.parse_args()
+	with metrics.instrumented(args, prefix="game"):
+		play(args)
+
+def play(args):
+
+	profiler = StartupProfiler(enabled=args.profile_startup, origin=_import_start)
+	profiler.record("import pygame + GUI", _import_start, _import_time)
+
+	# Os modelos carregam em segundo plano enquanto o usuário escolhe as cores
+	loader = ModelLoader(profiler, llm_backend=args.llm_backend)
+	loader.start()
+
 	# Initialize Pygame and create GUI
-	pygame.init()
-	gui = ChessGUI()
+	with profiler.phase("create GUI"):
+		pygame.init()
+		gui = ChessGUI()
 
 	# Show start screen and get player colors and seed
-	white_player, seed_input = gui.show_start_screen()
+	with profiler.phase("start screen"):
+		white_player, seed_input = gui.show_start_screen(loading_status=loader.loading_status)
 	if white_player is None:
 		print("Game cancelled")
 		return
@@ -40,30 +151,50 @@ def main():
 	# Recreate GUI with color information
 	gui = ChessGUI(rl_color=rl_color, llm_color=llm_color)
 
-	env = ChessEnvironment()
-	llm_player = LLMAgent()
-	rl_player = RLAgent(env)
+	# Espera o fim do carregamento sem travar a janela
+	with profiler.phase("wait for models"):
+		while loader.is_alive():
+			for event in pygame.event.get():
+				if event.type == pygame.QUIT or gui.check_quit(event):
+					print("Game cancelled")
+					pygame.quit()
+					return
+			status, progress = loader.loading_status()
+			pygame.display.update(gui.update(chess.Board(), f"{status} ({progress:.0%})", status, [], 0))
+			gui.clock.tick(30)
+	if loader.error is not None:
+		raise loader.error
+	llm_player = loader.llm_player
+	rl_player = loader.rl_player
 
-	# Train or load RL agent
-	model_path = "rl_model.zip"
-	if os.path.exists(model_path):
-		print("Loading pre-trained RL model...")
-		rl_player.model = PPO.load(model_path, env=rl_player.env)
-	else:
+	# Train RL agent if no pre-trained model was found
+	if rl_player.model is None:
 		print("Training RL agent...")
-		gui.update(chess.Board(), "Training RL agent...", "Waiting for RL agent...", [], 0)
-		pygame.display.flip()
-		rl_player.train(total_timesteps=50000, checkpoint_freq=10000)
+		pygame.display.update(gui.update(chess.Board(), "Training RL agent...", "Waiting for RL agent...", [], 0))
+		with profiler.phase("train RL model"):
+			rl_player.train(total_timesteps=50000, checkpoint_freq=10000, n_envs=os.cpu_count() or 1, use_subprocess=True)
 		print("RL agent training complete.")
 
+	profiler.report()
+
+	# Livro de aberturas e tablebases: os modelos só rodam quando a posição não está nas tabelas
+	lookup = MoveLookup(args.opening_book, args.tablebase)
+	lookup_stats = {"RL": LookupStats(), "LLM": LookupStats()}
+	# As posições da partida vão para o store de experiência quando ela termina
+	experience = ExperienceWriter(args.experience_dir) if args.experience_dir else None
+
 	board = chess.Board()
 	done = False
 	move_list = []
 	start_time = time.time()
+	end_time = None
 
-	gui.update(board, "RL agent ready", "LLM agent ready", move_list, 0)
-	pygame.display.flip()
-	time.sleep(2)  # Pause to show the "ready" message
+	rl_info, llm_info = "RL agent ready", "LLM agent ready"
+	resume_at = time.time() + 2  # Pause to show the "ready" message
+	pending = None  # (player, result_queue, started_at) do lance sendo calculado em segundo plano
+	cancel_event = threading.Event()
+	rl_is_white = white_player == "RL"
+	pondered_ply = None  # Lance para o qual o pondering já foi disparado
 
 	running = True
 	while running:
@@ -75,66 +206,85 @@ def main():
 		if not running:
 			break
 
-		if not done:
+		now = time.time()
+		# Na vez do RL (e já durante a pausa de visualização) o LLM calcula as respostas às jogadas prováveis do RL
+		if not args.no_ponder and not done and board.ply() != pondered_ply and (board.turn == chess.WHITE) == rl_is_white:
+			pondered_ply = board.ply()
+			llm_player.start_pondering(board, rl_player.top_moves(board, PONDER_REPLIES))
+
+		if not done and pending is None and now >= resume_at:
 			current_player = "White" if board.turn == chess.WHITE else "Black"
 			is_rl_turn = (current_player == "White" and white_player == "RL") or (current_player == "Black" and white_player == "LLM")
 
+			# O lance é calculado numa thread enquanto o loop continua tratando eventos e redesenhando
+			result_queue = Queue()
 			if is_rl_turn:
-				# RL player's turn
 				print("RL player's turn")
-				rl_action = rl_player.get_action(board)
-				rl_info = f"Thinking...\nChosen move: {rl_action}"
-				move_list.append(f"RL: {rl_action}")
-				gui.set_last_move(rl_action)
-				gui.update(board, rl_info, "Waiting for RL move...", move_list, time.time() - start_time)
-				pygame.display.flip()
-				time.sleep(1)  # Add delay for visualization
-				
-				move = chess.Move.from_uci(rl_action)
-				board.push(move)
-				gui.update(board, rl_info, "RL moved", move_list, time.time() - start_time)
-				pygame.display.flip()
-				time.sleep(1)  # Add delay for visualization
+				rl_info, llm_info = "Thinking...", "Waiting for RL move..."
+				worker = threading.Thread(target=get_rl_move, args=(rl_player, board.copy(), result_queue, lookup, lookup_stats["RL"]), daemon=True)
 			else:
-				# LLM player's turn
 				print("LLM player's turn")
-				llm_info = "Thinking..."
-				gui.update(board, "Waiting for LLM move...", llm_info, move_list, time.time() - start_time)
-				pygame.display.flip()
-
-				llm_action = llm_player.get_action(board.fen())
-
-				llm_info = f"Chosen move: {llm_action}"
-				move_list.append(f"LLM: {llm_action}")
-				gui.set_last_move(llm_action)
-				gui.update(board, "LLM moved", llm_info, move_list, time.time() - start_time)
-				pygame.display.flip()
-				
-				move = chess.Move.from_uci(llm_action)
+				rl_info, llm_info = "Waiting for LLM move...", "Thinking..."
+				worker = threading.Thread(target=get_llm_move, args=(llm_player, board.copy(), result_queue, cancel_event, lookup, lookup_stats["LLM"]), daemon=True)
+			worker.start()
+			pending = ("RL" if is_rl_turn else "LLM", result_queue, now)
+
+		elif pending is not None:
+			player, result_queue, started_at = pending
+			action = None
+			if not result_queue.empty():
+				action = result_queue.get()
+			elif now - started_at > MOVE_TIME_BUDGET:
+				# Tempo esgotado: joga o lance de emergência e descarta o resultado atrasado
+				action = llm_player.llm.fallback_move(board).uci()
+				metrics.inc("move_budget_exceeded_total", agent=player)
+				print(f"{player} exceeded the {MOVE_TIME_BUDGET}s move budget, using fallback move {action}")
+
+			if action is not None:
+				pending = None
+				metrics.inc("moves_total", agent=player)
+				move_list.append(f"{player}: {action}")
+				gui.set_last_move(action)
+				move = chess.Move.from_uci(action)
+				bitboards, turn = board_bitboards(board), board.turn == chess.WHITE
 				board.push(move)
-				gui.update(board, "LLM moved", llm_info, move_list, time.time() - start_time)
-				pygame.display.flip()
-				time.sleep(1)  # Add delay for visualization
-
-			if board.is_game_over():
-				print(f"Game over after {current_player}'s move")
-				done = True
-
-		if done:
-			result = board.result()
-			winner = "White" if result == "1-0" else "Black" if result == "0-1" else "Draw"
-			end_message = f"Game over: {winner} wins!" if winner != "Draw" else "Game over: It's a draw!"
-			gui.update(board, end_message, end_message, move_list, time.time() - start_time)
-			pygame.display.flip()
-
-			# Wait for user to quit
-			waiting = True
-			while waiting:
-				for event in pygame.event.get():
-					if event.type == pygame.QUIT or gui.check_quit(event):
-						waiting = False
-						running = False
+				if experience is not None:
+					reward = outcome_value(board.result()) if board.is_game_over() else 0
+					experience.add(bitboards, move_to_action(move), reward, turn)
+				if player == "RL":
+					rl_info, llm_info = f"Chosen move: {action}", "RL moved"
+				else:
+					rl_info, llm_info = "LLM moved", f"Chosen move: {action}"
+				resume_at = now + VISUALIZATION_DELAY
+
+				if board.is_game_over():
+					print(f"Game over after {player}'s move")
+					done = True
+					end_time = now
+					result = board.result()
+					winner = "White" if result == "1-0" else "Black" if result == "0-1" else "Draw"
+					end_message = f"Game over: {winner} wins!" if winner != "Draw" else "Game over: It's a draw!"
+					rl_info, llm_info = end_message, end_message
+					if experience is not None:
+						experience.end_game(outcome_value(result))
+
+		# Só as regiões que mudaram são enviadas para a tela
+		with metrics.timer("gui_frame_seconds"):
+			pygame.display.update(gui.update(board, rl_info, llm_info, move_list, (end_time or now) - start_time))
+		gui.clock.tick(30)
 
+	# Cancela a inferência que ainda estiver em andamento
+	cancel_event.set()
+	llm_player.stop_pondering()
+	if not args.no_ponder:
+		print(f"LLM pondering: {llm_player.ponder_stats()}")
+	for player, stats in lookup_stats.items():
+		print(f"{player} book/tablebase lookups: {stats.to_dict()}")
+	lookup.close()
+	if experience is not None:
+		experience.close()
+	print(f"LLM move cache: {llm_player.move_cache.stats()}")
+	llm_player.move_cache.close()
 	print("Game finished!")
 	pygame.quit()
 
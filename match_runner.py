@@ -0,0 +1,273 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import chess.pgn
+import torch
+
+import metrics
+from chess_environment.chess_env import ChessEnvironment
+from chess_environment.position import analyze
+from inference_service import BatchedInferenceService
+from llm_player.backends import backend_dependency_error, memory_usage_mb
+from llm_player.llm_agent import LLMAgent
+from lookup import LookupStats, MoveLookup
+from model_host import ModelHost
+from rl_player.rl_agent import RLAgent
+
+# Agentes carregados uma vez por processo do pool
+rl_player = None
+llm_player = None
+# Serviços de inferência em batch, usados quando o worker joga várias partidas ao mesmo tempo
+rl_service = None
+llm_service = None
+lookup = None
+worker_startup = None  # Segundos que o worker levou para ficar pronto
+profile_worker = False  # Roda cada tarefa do worker sob o cProfile (--profile)
+# Linhas (lances legais) pontuadas por batch do serviço do LLM, somando todas as posições do batch
+LLM_MAX_BATCH_ROWS = 256
+
+
+def init_worker(model_path, llm_mode, llm_backend, threads_per_worker, concurrent_games=1, max_wait=0.005,
+                book_path=None, tablebase_dir=None, shared_models=False, profile=False, trace=False):
+    global rl_player, llm_player, rl_service, llm_service, lookup, worker_startup, profile_worker
+    start_time = time.perf_counter()
+    # As métricas herdadas do pai no fork não são deste worker: cada captura devolve só o que ele registrou
+    metrics.registry.drain()
+    if trace:
+        metrics.registry.start_trace()
+    profile_worker = profile
+    torch.set_num_threads(threads_per_worker)
+    # Arquivos mapeados em memória: os workers dividem as mesmas páginas do cache do sistema
+    lookup = MoveLookup(book_path, tablebase_dir)
+    if not shared_models:
+        rl_player = RLAgent(ChessEnvironment())
+        rl_player.load(model_path)
+        llm_player = LLMAgent(mode=llm_mode, verbose=False, backend=llm_backend)
+    # Com shared_models os agentes vieram do ModelHost do processo pai, herdados pelo fork
+    if concurrent_games > 1:
+        rl_service = BatchedInferenceService(rl_player.get_actions, concurrent_games, max_wait, name="rl-service")
+        if llm_mode == "score":
+            # O custo de uma posição é o número de lances legais, não o de pedidos
+            llm_service = BatchedInferenceService(llm_player.get_actions, concurrent_games, max_wait, name="llm-service",
+                                                  cost=lambda fen: len(analyze(chess.Board(fen)).legal_moves),
+                                                  max_batch_cost=LLM_MAX_BATCH_ROWS)
+    worker_startup = time.perf_counter() - start_time
+
+
+def host_models(model_path, llm_mode, llm_backend):
+    # Carrega os agentes no processo pai; os workers do pool do host os herdam no fork
+    global rl_player, llm_player
+    host = ModelHost(model_path, llm_mode, llm_backend)
+    rl_player, llm_player = host.rl_player, host.llm_player
+    return host
+
+
+def rl_move(board):
+    if rl_service is not None:
+        return rl_service(board.copy())
+    return rl_player.get_action(board)
+
+
+def llm_move(board):
+    if llm_service is not None:
+        return llm_service(board.fen())
+    return llm_player.get_action(board.fen())
+
+
+def play_game(game_index, rl_white, max_plies, seed, on_move=None):
+    # on_move(uci, agent) é chamado a cada lance (usado pelo modo espectador).
+    # seed=None: o RNG global já foi semeado por quem chamou e a partida não é reproduzível sozinha
+    if seed is not None:
+        random.seed(seed)
+    board = chess.Board()
+    moves = []
+    lookup_stats = {"RL": LookupStats(), "LLM": LookupStats()}
+    start_time = time.time()
+
+    while not board.is_game_over() and len(board.move_stack) < max_plies:
+        agent = "RL" if (board.turn == chess.WHITE) == rl_white else "LLM"
+        move_start = time.perf_counter()
+        move_uci, source = lookup.choose(board, rl_move if agent == "RL" else llm_move, lookup_stats[agent], agent=agent)
+        latency = time.perf_counter() - move_start
+
+        moves.append({"agent": agent, "move": move_uci, "latency": latency, "source": source})
+        board.push_uci(move_uci)
+        if on_move is not None:
+            on_move(move_uci, agent)
+
+    result = board.result() if board.is_game_over() else "*"
+    outcome = board.outcome()
+
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = "RL vs LLM"
+    game.headers["Round"] = str(game_index + 1)
+    game.headers["White"] = "RL" if rl_white else "LLM"
+    game.headers["Black"] = "LLM" if rl_white else "RL"
+    game.headers["Result"] = result
+
+    return {
+        "game": game_index,
+        "seed": seed,
+        "rl_color": "White" if rl_white else "Black",
+        "result": result,
+        "termination": outcome.termination.name.lower() if outcome else "max_plies",
+        "plies": len(board.move_stack),
+        "duration": time.time() - start_time,
+        "moves": moves,
+        "lookup": {agent: stats.to_dict() for agent, stats in lookup_stats.items()},
+        "worker": {"pid": os.getpid(), "startup": worker_startup, **{f"{name}_mb": value for name, value in memory_usage_mb().items()}},
+        "pgn": str(game),
+    }
+
+
+def play_games_task(tasks):
+    # Devolve as partidas e a captura de métricas/cProfile do worker, que o processo principal junta às dele
+    return metrics.run_captured(play_games, tasks, profile=profile_worker)
+
+
+def play_games(tasks):
+    # As partidas de um mesmo worker rodam em threads e dividem os forwards em batch
+    if len(tasks) == 1:
+        return [play_game(*tasks[0])]
+    # O RNG global é um só para as threads: semeado uma vez por grupo, sem seed reproduzível por partida
+    random.seed(tasks[0][3])
+    with ThreadPoolExecutor(len(tasks)) as executor:
+        return list(executor.map(play_threaded_game, tasks))
+
+
+def play_threaded_game(task):
+    with metrics.thread_profile():
+        return play_game(*task[:3], None)
+
+
+def summarize(games):
+    summary = {"games": len(games), "rl_wins": 0, "llm_wins": 0, "draws": 0, "unfinished": 0}
+    for game in games:
+        if game["result"] == "*":
+            summary["unfinished"] += 1
+        elif game["result"] == "1/2-1/2":
+            summary["draws"] += 1
+        elif (game["result"] == "1-0") == (game["rl_color"] == "White"):
+            summary["rl_wins"] += 1
+        else:
+            summary["llm_wins"] += 1
+
+    for agent in ("RL", "LLM"):
+        latencies = [move["latency"] for game in games for move in game["moves"] if move["agent"] == agent]
+        if latencies:
+            summary[f"{agent.lower()}_latency"] = {
+                "moves": len(latencies),
+                "mean": statistics.mean(latencies),
+                "median": statistics.median(latencies),
+                "max": max(latencies),
+            }
+        lookup_games = [game["lookup"][agent] for game in games]
+        hits = sum(stats["book_hits"] + stats["tablebase_hits"] for stats in lookup_games)
+        total_moves = sum(stats["moves"] for stats in lookup_games)
+        summary[f"{agent.lower()}_lookup"] = {
+            "book_hits": sum(stats["book_hits"] for stats in lookup_games),
+            "tablebase_hits": sum(stats["tablebase_hits"] for stats in lookup_games),
+            "hit_rate": hits / total_moves if total_moves else 0.0,
+            "time_saved": sum(stats["time_saved"] for stats in lookup_games),
+        }
+
+    # Memória e tempo de inicialização de cada worker (pico ao longo das partidas dele)
+    workers = {}
+    for game in games:
+        worker = game["worker"]
+        entry = workers.setdefault(str(worker["pid"]), {"startup": worker["startup"], "games": 0})
+        entry["games"] += 1
+        for name, value in worker.items():
+            if name.endswith("_mb"):
+                entry[name] = max(entry.get(name, 0.0), value)
+    summary["workers"] = workers
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play RL vs LLM games without the GUI")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-plies", type=int, default=300)
+    parser.add_argument("--model", default="rl_model.zip")
+    parser.add_argument("--llm-mode", default="score", choices=["score", "sample"])
+    parser.add_argument("--llm-backend", default="eager", choices=["eager", "int8", "onnx"])
+    parser.add_argument("--concurrent-games", type=int, default=1,
+                        help="games played at once by each worker, batched into shared forward passes")
+    parser.add_argument("--max-wait", type=float, default=0.005,
+                        help="seconds a batch waits for more requests before running")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--opening-book", default="book.bin", help="Polyglot opening book consulted before both agents")
+    parser.add_argument("--tablebase", default="syzygy", help="directory with Syzygy tablebases consulted before both agents")
+    parser.add_argument("--output-dir", default="matches")
+    parser.add_argument("--share-models", action="store_true",
+                        help="load the models once and fork workers that share the weights copy-on-write")
+    metrics.add_cli_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        parser.error(f"RL model not found: {args.model} (train it first by running main.py)")
+    if error := backend_dependency_error(args.llm_backend):
+        parser.error(error)
+
+    base_seed = args.seed if args.seed is not None else random.randint(1, 1000000)
+    concurrent_games = max(1, args.concurrent_games)
+    # Cores alternadas: o RL joga de brancas nas partidas pares
+    tasks = [(i, i % 2 == 0, args.max_plies, base_seed + i) for i in range(args.games)]
+    chunks = [tasks[i:i + concurrent_games] for i in range(0, len(tasks), concurrent_games)]
+    workers = max(1, min(args.workers, len(chunks)))
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    print(f"Playing {args.games} games on {workers} workers (seed {base_seed})")
+    start_time = time.time()
+    games = []
+    initargs = (args.model, args.llm_mode, args.llm_backend, threads_per_worker, concurrent_games, args.max_wait,
+                args.opening_book, args.tablebase, args.share_models, bool(args.profile), bool(args.trace))
+    if args.share_models:
+        host = host_models(args.model, args.llm_mode, args.llm_backend)
+        print(f"Models loaded once in {host.load_time:.1f}s; {host.shared_mb:.0f} MB of weights shared with the workers")
+        pool = host.pool(workers, initializer=init_worker, initargs=initargs)
+    else:
+        pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=initargs)
+    with metrics.instrumented(args, prefix="matches"), pool:
+        for chunk, capture in pool.imap_unordered(play_games_task, chunks):
+            metrics.merge_capture(capture)
+            for game in chunk:
+                games.append(game)
+                # As latências medidas nos workers são agregadas no processo principal
+                for move in game["moves"]:
+                    metrics.observe("move_seconds", move["latency"], agent=move["agent"])
+                metrics.inc("games_total", result=game["result"])
+                print(f"Game {game['game'] + 1}: {game['result']} in {game['plies']} plies ({game['duration']:.1f}s)")
+    games.sort(key=lambda game: game["game"])
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, "games.pgn"), "w") as pgn_file:
+        for game in games:
+            pgn_file.write(game["pgn"] + "\n\n")
+
+    summary = summarize(games)
+    summary["seed"] = base_seed
+    # Partidas simultâneas dividem o RNG global, então a seed não reproduz cada partida
+    summary["reproducible"] = concurrent_games == 1
+    summary["wall_time"] = time.time() - start_time
+    summary["results"] = [{key: value for key, value in game.items() if key != "pgn"} for game in games]
+    with open(os.path.join(args.output_dir, "summary.json"), "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+
+    for pid, worker in summary["workers"].items():
+        memory = ", ".join(f"{name[:-3].upper()} {value:.0f} MB" for name, value in worker.items() if name.endswith("_mb"))
+        print(f"Worker {pid}: ready in {worker['startup']:.2f}s, {memory}")
+    print(f"RL {summary['rl_wins']} - LLM {summary['llm_wins']} - draws {summary['draws']} "
+          f"in {summary['wall_time']:.1f}s; results in {args.output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
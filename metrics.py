@@ -0,0 +1,298 @@
+import bisect
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+
+# Limites dos buckets de latência em segundos, no estilo dos histogramas do Prometheus
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # O último bucket é o +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, counts, count, total):
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+        self.count += count
+        self.sum += total
+
+    def to_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    # Contadores e histogramas em memória; exportados como JSON lines ou no formato texto do Prometheus
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.origin = time.perf_counter()
+        self.trace_events = None  # Lista de spans quando o trace está ligado
+
+    def inc(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.observe(name, elapsed, **labels)
+            if self.trace_events is not None:
+                self._record_span(name, labels, start_time, elapsed)
+
+    def start_trace(self):
+        self.trace_events = []
+
+    def _record_span(self, name, labels, start_time, elapsed):
+        # Formato "complete event" do chrome://tracing / Perfetto
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": (start_time - self.origin) * 1e6,
+            "dur": elapsed * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": labels,
+        }
+        with self.lock:
+            self.trace_events.append(event)
+
+    def write_trace(self, path):
+        with self.lock:
+            events = list(self.trace_events or [])
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events}, trace_file)
+
+    def snapshot(self):
+        with self.lock:
+            counters = [(name, labels, value) for (name, labels), value in self.counters.items()]
+            histograms = [(name, labels, histogram.to_dict()) for (name, labels), histogram in self.histograms.items()]
+        return counters, histograms
+
+    def drain(self):
+        # Estado bruto (serializável) desde o último drain, zerando o registro; usado pelos workers de um pool
+        with self.lock:
+            state = {
+                "counters": self.counters,
+                "histograms": {key: (histogram.buckets, histogram.counts, histogram.count, histogram.sum)
+                               for key, histogram in self.histograms.items()},
+                "trace_events": self.trace_events or [],
+            }
+            self.counters = {}
+            self.histograms = {}
+            if self.trace_events is not None:
+                self.trace_events = []
+        return state
+
+    def merge(self, state):
+        # Soma o estado vindo de outro processo (drain) a este registro
+        with self.lock:
+            for key, value in state["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (buckets, counts, count, total) in state["histograms"].items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(buckets)
+                histogram.merge(counts, count, total)
+            if self.trace_events is not None:
+                self.trace_events.extend(state["trace_events"])
+
+    def write_jsonl(self, path):
+        # Uma linha por métrica, acrescentada ao arquivo a cada exportação
+        counters, histograms = self.snapshot()
+        timestamp = time.time()
+        with open(path, "a") as jsonl_file:
+            for name, labels, value in counters:
+                record = {"ts": timestamp, "type": "counter", "name": name, "labels": dict(labels), "value": value}
+                jsonl_file.write(json.dumps(record) + "\n")
+            for name, labels, histogram in histograms:
+                record = {"ts": timestamp, "type": "histogram", "name": name, "labels": dict(labels), **histogram}
+                jsonl_file.write(json.dumps(record) + "\n")
+
+    def write_prometheus(self, path):
+        counters, histograms = self.snapshot()
+        lines = []
+        for name in sorted({name for name, _, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for counter_name, labels, value in counters:
+                if counter_name == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name in sorted({name for name, _, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for histogram_name, labels, histogram in histograms:
+                if histogram_name != name:
+                    continue
+                for bound, count in histogram["buckets"].items():
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        # Escrita atômica para o node exporter (textfile collector) nunca ler um arquivo pela metade
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as prometheus_file:
+            prometheus_file.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+    def export(self, directory, prefix="metrics"):
+        os.makedirs(directory, exist_ok=True)
+        self.write_jsonl(os.path.join(directory, f"{prefix}.jsonl"))
+        self.write_prometheus(os.path.join(directory, f"{prefix}.prom"))
+
+
+# Registro padrão do processo
+registry = MetricsRegistry()
+inc = registry.inc
+observe = registry.observe
+timer = registry.timer
+# O cProfile só vê a thread que o ligou. Com --profile, as threads de trabalho rodam cada tarefa sob um Profile
+# próprio (thread_profile); os stats delas e os que chegam dos workers somam-se ao perfil principal no fim
+profiled_thread = None  # Thread do Profile principal do processo; None com o cProfile desligado
+collected_profiles = None
+profiles_lock = threading.Lock()
+
+
+class _CollectedProfile:
+    # Stats já coletados em outra thread ou processo, no formato que o pstats.Stats sabe carregar
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def _collect_profile(stats):
+    global collected_profiles
+    with profiles_lock:
+        if collected_profiles is None:
+            collected_profiles = pstats.Stats(_CollectedProfile(stats))
+        else:
+            collected_profiles.add(_CollectedProfile(stats))
+
+
+def _profile_stats(profiler):
+    # Stats do Profile principal mais os coletados até agora, esvaziando a coleta
+    global collected_profiles
+    stats = pstats.Stats(profiler)
+    with profiles_lock:
+        if collected_profiles is not None:
+            stats.add(collected_profiles)
+        collected_profiles = None
+    return stats
+
+
+@contextlib.contextmanager
+def thread_profile():
+    # Para o trabalho feito fora da thread principal (lances, partidas simultâneas, batches de inferência)
+    if profiled_thread is None or profiled_thread == threading.get_ident():
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: só um profiler por vez, e o principal já cobre todas as threads
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.create_stats()
+        _collect_profile(profiler.stats)
+
+
+def _start_profile():
+    global profiled_thread
+    profiler = cProfile.Profile()
+    profiler.enable()
+    profiled_thread = threading.get_ident()
+    return profiler
+
+
+def run_captured(function, *args, profile=False):
+    # Para os workers de um pool: roda function e devolve (resultado, captura). A captura traz as métricas
+    # registradas no worker desde a anterior e, com profile, os stats do cProfile (threads do worker incluídas);
+    # o pai a passa a merge_capture
+    profiler = _start_profile() if profile else None
+    try:
+        result = function(*args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    capture = {"metrics": registry.drain()}
+    if profiler is not None:
+        capture["profile"] = _profile_stats(profiler).stats
+    return result, capture
+
+
+def merge_capture(capture):
+    registry.merge(capture["metrics"])
+    if "profile" in capture:
+        _collect_profile(capture["profile"])
+
+
+def add_cli_arguments(parser):
+    parser.add_argument("--metrics-dir", help="write metrics as JSON lines and a Prometheus text file to this directory on exit")
+    parser.add_argument("--profile", metavar="PATH", help="run under cProfile and write the stats to PATH")
+    parser.add_argument("--trace", metavar="PATH", help="write timed spans as a chrome://tracing JSON file to PATH")
+
+
+@contextlib.contextmanager
+def instrumented(args, prefix="metrics"):
+    # Liga o cProfile e o trace pedidos na linha de comando e exporta tudo no final
+    if args.trace:
+        registry.start_trace()
+    profiler = _start_profile() if args.profile else None
+    try:
+        yield registry
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _profile_stats(profiler).dump_stats(args.profile)
+            print(f"cProfile stats written to {args.profile}")
+        if args.trace:
+            registry.write_trace(args.trace)
+            print(f"Trace written to {args.trace}")
+        if args.metrics_dir:
+            registry.export(args.metrics_dir, prefix)
+            print(f"Metrics written to {args.metrics_dir}")
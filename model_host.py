@@ -0,0 +1,42 @@
+import gc
+import multiprocessing
+import time
+
+import torch
+
+from chess_environment.chess_env import ChessEnvironment
+from llm_player.llm_agent import LLMAgent
+from rl_player.rl_agent import RLAgent
+
+
+class ModelHost:
+    # Carrega os dois modelos uma vez no processo pai e os workers, criados com fork, reaproveitam essas páginas
+    # copy-on-write em vez de carregar uma cópia cada um. Os pesos do LLM já vêm mapeados do arquivo safetensors
+    # (backends.load_gpt2): são páginas limpas do page cache, que nenhum processo chega a copiar.
+    def __init__(self, model_path, llm_mode="score", llm_backend="eager"):
+        start_time = time.perf_counter()
+        # Carrega com uma thread só: se o pool do OpenMP já existir no pai, os filhos travam no primeiro matmul após o fork
+        torch.set_num_threads(1)
+        self.rl_player = RLAgent(ChessEnvironment())
+        self.rl_player.load(model_path)
+        self.llm_player = LLMAgent(mode=llm_mode, verbose=False, backend=llm_backend)
+        self.load_time = time.perf_counter() - start_time
+        self.shared_mb = sum(self._prepare(module) for module in self.modules()) / 2**20
+
+    def modules(self):
+        modules = [self.rl_player.model.policy]
+        # O backend ONNX guarda os pesos na sessão do ONNX Runtime: ficam compartilhados só pelo copy-on-write do fork
+        if isinstance(self.llm_player.llm.model, torch.nn.Module):
+            modules.append(self.llm_player.llm.model)
+        return modules
+
+    def _prepare(self, module):
+        # Sem share_memory(): copiaria os pesos para /dev/shm, trocando as páginas do arquivo por memória anônima
+        module.eval()
+        return sum(tensor.numel() * tensor.element_size() for tensor in list(module.parameters()) + list(module.buffers()))
+
+    def pool(self, processes, initializer=None, initargs=()):
+        # Coleta o lixo agora e congela os objetos restantes: o GC dos filhos não percorre (nem copia) essas páginas
+        gc.collect()
+        gc.freeze()
+        return multiprocessing.get_context("fork").Pool(processes, initializer=initializer, initargs=initargs)
@@ -0,0 +1,176 @@
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+import metrics
+from chess_environment.encoder import planes_to_bitboards
+
+
+class MetricsCallback(BaseCallback):
+    # Mede as fases do PPO: coleta de rollout e atualização da política (o que ocorre entre dois rollouts)
+    def __init__(self, verbose=0):
+        super().__init__(verbose)
+        self.rollout_start = None
+        self.update_start = None
+
+    def _on_rollout_start(self):
+        now = time.perf_counter()
+        if self.update_start is not None:
+            metrics.observe("ppo_update_seconds", now - self.update_start)
+            self.update_start = None
+        self.rollout_start = now
+
+    def _on_step(self):
+        return True
+
+    def _on_rollout_end(self):
+        now = time.perf_counter()
+        elapsed = now - self.rollout_start
+        steps = self.model.n_steps * self.training_env.num_envs
+        metrics.observe("ppo_rollout_seconds", elapsed)
+        metrics.inc("ppo_rollout_steps_total", steps)
+        # O time/fps do SB3 inclui a atualização; este mede só a coleta nos tabuleiros
+        self.logger.record("rollout/env_steps_per_second", steps / elapsed)
+        self.update_start = now
+
+    def _on_training_end(self):
+        if self.update_start is not None:
+            metrics.observe("ppo_update_seconds", time.perf_counter() - self.update_start)
+            self.update_start = None
+
+
+def write_atomic(path, data):
+    # Escreve num arquivo temporário e renomeia: um checkpoint nunca fica pela metade se o processo morrer
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as checkpoint_file:
+        checkpoint_file.write(data)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temp_path, path)
+
+
+class AsyncCheckpointCallback(BaseCallback):
+    # Serializa o modelo em memória (rápido) e grava no disco numa thread, sem parar a coleta de rollouts.
+    # O zip do SB3 inclui o estado do otimizador e num_timesteps, então o treino pode ser retomado dele.
+    def __init__(self, save_freq, path, verbose=1):
+        super().__init__(verbose)
+        self.save_freq = save_freq
+        self.path = path
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-writer")
+        self.pending = None
+        self.last_save = 0
+
+    def _init_callback(self):
+        self.last_save = self.model.num_timesteps  # Diferente de zero quando o treino foi retomado
+
+    def _on_step(self):
+        # Salva nos múltiplos de save_freq, também depois de retomar
+        if self.num_timesteps // self.save_freq > self.last_save // self.save_freq:
+            self.save()
+        return True
+
+    def save(self):
+        self.last_save = self.num_timesteps
+        buffer = io.BytesIO()
+        self.model.save(buffer)
+        if self.pending is not None:
+            self.pending.result()  # No máximo uma gravação na fila
+        self.pending = self.writer.submit(self._write, buffer.getvalue(), self.num_timesteps)
+
+    def _write(self, data, num_timesteps):
+        start_time = time.perf_counter()
+        write_atomic(self.path, data)
+        metrics.observe("checkpoint_write_seconds", time.perf_counter() - start_time)
+        if self.verbose:
+            print(f"Checkpoint saved at {num_timesteps} steps ({len(data) / 1e6:.1f} MB)")
+
+    def _on_training_end(self):
+        if self.num_timesteps > self.last_save:
+            self.save()
+        self.writer.shutdown(wait=True)
+        self.pending = None
+
+
+class EvaluationCallback(BaseCallback):
+    # Joga partidas contra a política de emergência num processo separado enquanto o treino continua
+    def __init__(self, eval_freq, games=10, max_plies=200, seed=0, verbose=1):
+        super().__init__(verbose)
+        self.eval_freq = eval_freq
+        self.games = games
+        self.max_plies = max_plies
+        self.seed = seed
+        self.executor = None
+        self.pending = None
+        self.last_eval = 0
+        self.results = []
+
+    def _init_callback(self):
+        self.last_eval = self.model.num_timesteps
+        # spawn: o processo de avaliação não herda as threads do torch do processo de treino
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+    def _on_step(self):
+        self._collect()
+        if self.pending is None and self.num_timesteps // self.eval_freq > self.last_eval // self.eval_freq:
+            self.evaluate()
+        return True
+
+    def evaluate(self):
+        from rl_player.evaluation import evaluate_model
+        self.last_eval = self.num_timesteps
+        buffer = io.BytesIO()
+        self.model.save(buffer)
+        self.pending = self.executor.submit(evaluate_model, buffer.getvalue(), self.num_timesteps,
+                                            self.games, self.max_plies, self.seed)
+
+    def _collect(self, wait=False):
+        if self.pending is None or not (wait or self.pending.done()):
+            return
+        future, self.pending = self.pending, None
+        try:
+            result = future.result()
+        except Exception as error:
+            print(f"Evaluation failed: {error}")
+            return
+        self.results.append(result)
+        metrics.inc("eval_games_total", result["games"])
+        self.logger.record("eval/score_vs_fallback", result["score"])
+        if self.verbose:
+            print(f"Evaluation at {result['num_timesteps']} steps: {result['wins']}W {result['draws']}D "
+                  f"{result['losses']}L vs fallback (score {result['score']:.2f})")
+
+    def _on_training_end(self):
+        self._collect(wait=True)
+        self.executor.shutdown(wait=True)
+
+
+class ExperienceCallback(BaseCallback):
+    # Grava os rollouts de self-play no ExperienceWriter; cada tabuleiro do VecEnv é uma partida separada
+    def __init__(self, writer, verbose=0):
+        super().__init__(verbose)
+        self.writer = writer
+        self.plies = None
+
+    def _init_callback(self):
+        self.plies = np.zeros(self.training_env.num_envs, dtype=np.int64)
+
+    def _on_step(self):
+        # Durante o callback o modelo ainda guarda a observação de antes do passo
+        bitboards = planes_to_bitboards(self.model._last_obs)
+        actions, rewards, dones = self.locals["actions"], self.locals["rewards"], self.locals["dones"]
+        for i in range(len(dones)):
+            self.writer.add(bitboards[i], int(actions[i]), float(rewards[i]), turn=self.plies[i] % 2 == 0, game=i)
+            self.plies[i] += 1
+            if dones[i]:
+                # A recompensa final do ambiente já é o resultado do ponto de vista das brancas
+                self.writer.end_game(int(np.sign(rewards[i])), game=i)
+                self.plies[i] = 0
+        return True
+
+    def _on_training_end(self):
+        self.writer.close()
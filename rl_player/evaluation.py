@@ -0,0 +1,39 @@
+import io
+import random
+
+import chess
+
+from chess_environment.chess_env import ChessEnvironment
+from llm_player.fallback import fallback_move
+from rl_player.rl_agent import RLAgent
+
+
+def play_evaluation_game(rl_player, rl_white, max_plies, seed):
+    # Partida do RL contra a política de emergência do LLM; devolve a pontuação do RL (1, 0.5 ou 0)
+    random.seed(seed)
+    board = chess.Board()
+    while not board.is_game_over() and len(board.move_stack) < max_plies:
+        if (board.turn == chess.WHITE) == rl_white:
+            board.push_uci(rl_player.get_action(board))
+        else:
+            board.push(fallback_move(board))
+
+    result = board.result() if board.is_game_over() else "1/2-1/2"  # Partida interrompida conta como empate
+    if result == "1/2-1/2":
+        return 0.5
+    return 1.0 if (result == "1-0") == rl_white else 0.0
+
+
+def evaluate_model(model_bytes, num_timesteps, games=10, max_plies=200, seed=0):
+    # Roda num processo separado: recebe o modelo serializado em memória para não ler um checkpoint pela metade
+    rl_player = RLAgent(ChessEnvironment())
+    rl_player.load(io.BytesIO(model_bytes))
+    scores = [play_evaluation_game(rl_player, i % 2 == 0, max_plies, seed + i) for i in range(games)]
+    return {
+        "num_timesteps": num_timesteps,
+        "games": games,
+        "wins": scores.count(1.0),
+        "draws": scores.count(0.5),
+        "losses": scores.count(0.0),
+        "score": sum(scores) / games,
+    }
@@ -1,24 +1,55 @@
 import os
 import random
 from stable_baselines3 import PPO
-from stable_baselines3.common.vec_env import DummyVecEnv
+from stable_baselines3.common.callbacks import CallbackList
+from stable_baselines3.common.vec_env import DummyVecEnv, VecEnv
+try:
+    # Opcional: PPO com máscara de lances legais durante o treino
+    from sb3_contrib import MaskablePPO
+    from sb3_contrib.common.maskable.policies import MaskableActorCriticPolicy
+except ImportError:
+    MaskablePPO = None
 import torch
 import numpy as np
+import torch.nn.functional as F
+from chess_environment.action_codec import NUM_ACTIONS, actions_to_moves
+from chess_environment.position import analyze
+from chess_environment.encoder import encode_boards
+from chess_environment.experience import ExperienceStore, ExperienceWriter
+from chess_environment.vec_env import make_chess_vec_env
+from rl_player.callbacks import AsyncCheckpointCallback, EvaluationCallback, ExperienceCallback, MetricsCallback
 
 class RLAgent:
     def __init__(self, env):
-        self.env = DummyVecEnv([lambda: env])
+        if isinstance(env, VecEnv):
+            self.env = env
+        else:
+            self.env = DummyVecEnv([lambda: env])
         self.model_path = "rl_model.zip"
         self.checkpoint_path = "rl_model_checkpoint.zip"
         self.model = None
 
-    def train(self, total_timesteps=50000, checkpoint_freq=10000):
-        if os.path.exists(self.model_path):
+    def train(self, total_timesteps=50000, checkpoint_freq=10000, n_envs=1, use_subprocess=False,
+              eval_freq=None, eval_games=10, pretrain_dir=None, experience_dir=None, n_workers=None):
+        if n_envs > 1 or use_subprocess:
+            # Coleta os rollouts em N tabuleiros em paralelo
+            self.env = make_chess_vec_env(n_envs, use_subprocess=use_subprocess, n_workers=n_workers)
+            print(f"Collecting rollouts from {n_envs} boards")
+
+        resuming = os.path.exists(self.checkpoint_path)
+        if resuming:
+            # Retoma com o otimizador e a contagem de passos salvos no checkpoint
+            self.load(self.checkpoint_path)
+            print(f"Resuming from checkpoint at {self.model.num_timesteps} steps")
+        elif os.path.exists(self.model_path):
             print("Loading pre-trained model...")
-            self.model = PPO.load(self.model_path, env=self.env)
+            self.load(self.model_path)
         else:
             print("Training new model...")
-            self.model = PPO("MlpPolicy", self.env, verbose=1, 
+            if MaskablePPO is None:
+                print("sb3-contrib not installed, training without action masking")
+            algorithm = MaskablePPO or PPO
+            self.model = algorithm("MlpPolicy", self.env, verbose=1, 
                              device='cuda' if torch.cuda.is_available() else 'cpu',
                              learning_rate=1e-4,
                              n_steps=1024,
@@ -27,35 +58,123 @@ class RLAgent:
                              gamma=0.99,
                              gae_lambda=0.95,
                              clip_range=0.2)
-        
-        for i in range(0, total_timesteps, checkpoint_freq):
-            self.model.learn(total_timesteps=checkpoint_freq)
-            self.model.save(self.checkpoint_path)
-            print(f"Checkpoint saved at {i+checkpoint_freq} steps")
+            if pretrain_dir:
+                self.pretrain(pretrain_dir)
+
+        remaining = total_timesteps - self.model.num_timesteps if resuming else total_timesteps
+        callbacks = [MetricsCallback(), AsyncCheckpointCallback(checkpoint_freq, self.checkpoint_path)]
+        if eval_freq:
+            callbacks.append(EvaluationCallback(eval_freq, games=eval_games))
+        if experience_dir:
+            callbacks.append(ExperienceCallback(ExperienceWriter(experience_dir)))
+        if remaining > 0:
+            # Um único learn(): o SB3 mantém a contagem de passos e o agendamento entre checkpoints
+            self.model.learn(total_timesteps=remaining, callback=CallbackList(callbacks),
+                             reset_num_timesteps=not resuming)
 
         self.model.save(self.model_path)
         print(f"Final model saved to {self.model_path}")
+        # Treino concluído: o próximo train() não deve retomar deste checkpoint
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def pretrain(self, directory, epochs=1, batch_size=256):
+        # Behavior cloning a partir do ExperienceStore: maximiza a log-prob dos lances gravados e
+        # ajusta o value ao resultado final (ponto de vista das brancas, como a recompensa do ambiente)
+        store = ExperienceStore(directory)
+        print(f"Pretraining on {len(store)} positions from {store.games} games")
+        policy = self.model.policy
+        policy.set_training_mode(True)
+        for epoch in range(epochs):
+            total_loss, batches = 0.0, 0
+            for batch in store.iter_batches(batch_size, seed=epoch):
+                observations = torch.as_tensor(batch["observations"], device=policy.device)
+                actions = torch.as_tensor(batch["actions"], device=policy.device)
+                outcomes = torch.as_tensor(batch["outcomes"], dtype=torch.float32, device=policy.device)
+                values, log_prob, _ = policy.evaluate_actions(observations, actions)
+                loss = -log_prob.mean() + 0.5 * F.mse_loss(values.flatten(), outcomes)
+                policy.optimizer.zero_grad()
+                loss.backward()
+                torch.nn.utils.clip_grad_norm_(policy.parameters(), self.model.max_grad_norm)
+                policy.optimizer.step()
+                total_loss += loss.item()
+                batches += 1
+            print(f"Pretraining epoch {epoch + 1}/{epochs}: loss {total_loss / max(batches, 1):.4f}")
+        policy.set_training_mode(False)
+
+    def load(self, path):
+        # Tenta MaskablePPO primeiro; modelos antigos foram salvos com PPO sem máscara, e o MaskablePPO.load
+        # recusa a política deles com ValueError: nesse caso passa para o próximo algoritmo
+        for algorithm in (MaskablePPO, PPO):
+            if algorithm is None:
+                continue
+            try:
+                self.model = self._load_as(algorithm, path)
+            except ValueError as error:
+                load_error = error
+                continue
+            return self.model
+        raise load_error
+
+    def _load_as(self, algorithm, path):
+        if hasattr(path, "seek"):
+            path.seek(0)
+        try:
+            return algorithm.load(path, env=self.env)
+        except ValueError:
+            # Espaço de ações de antes das subpromoções (4096): o modelo joga, mas não continua o treino
+            if hasattr(path, "seek"):
+                path.seek(0)
+            return algorithm.load(path)
 
     def get_action(self, board):
-        state = self.board_to_state(board)
-        action, _ = self.model.predict(state, deterministic=True)
-        return self.action_to_move(action, board)
+        return self.get_actions([board])[0]
+
+    def get_actions(self, boards):
+        # Um único forward da política para vários tabuleiros
+        states = encode_boards(boards)
+        analyses = [analyze(board) for board in boards]
+        masks = np.zeros((len(boards), NUM_ACTIONS), dtype=bool)
+        for row, analysis in enumerate(analyses):
+            masks[row, analysis.legal_actions] = True
+        actions = self.masked_predict(states, masks)
+        moves = actions_to_moves(actions, boards)
+        return [self.checked_move(move, analysis) for move, analysis in zip(moves, analyses)]
+
+    def top_moves(self, board, k=3):
+        # Os k lances legais mais prováveis segundo a política (usados pelo pondering do LLM)
+        analysis = analyze(board)
+        masks = np.zeros((1, NUM_ACTIONS), dtype=bool)
+        masks[0, analysis.legal_actions] = True
+        logits = self.masked_logits(encode_boards([board]), masks)[0]
+        best = np.argsort(-logits, kind="stable")[:min(k, len(analysis.legal_moves))]
+        return [self.checked_move(move, analysis) for move in actions_to_moves(best, [board] * len(best))]
+
+    def masked_logits(self, states, masks):
+        # Logits da política com -inf nos lances ilegais; funciona com PPO e MaskablePPO
+        obs, _ = self.model.policy.obs_to_tensor(states)
+        with torch.no_grad():
+            distribution = self.model.policy.get_distribution(obs)
+        logits = distribution.distribution.logits.cpu().numpy()
+        # Modelos treinados antes das subpromoções só têm as 4096 ações de origem/destino
+        masks = masks[:, :logits.shape[-1]]
+        logits[~masks] = -np.inf
+        return logits
+
+    def masked_predict(self, states, masks):
+        # Argmax restrito aos lances legais
+        return self.masked_logits(states, masks).argmax(axis=-1)
 
     def board_to_state(self, board):
-        # Converte o tabuleiro para o formato esperado pelo modelo (8, 8, 12)
-        state = np.zeros((8, 8, 12), dtype=np.float32)
-        piece_map = board.piece_map()
-        for square, piece in piece_map.items():
-            rank, file = divmod(square, 8)
-            piece_type = piece.piece_type - 1
-            color = int(piece.color)
-            state[rank, file, piece_type + 6*color] = 1
-        return state.reshape(1, 8, 8, 12)  # Adicione uma dimensão extra para batch
+        # Converte o tabuleiro para o formato esperado pelo modelo (1, 8, 8, 12)
+        return encode_boards([board])
 
     def action_to_move(self, action, board):
-        # Converte a ação do modelo para um movimento válido no tabuleiro
-        legal_moves = list(board.legal_moves)
-        if action < len(legal_moves):
-            return legal_moves[action].uci()
+        # Converte a ação do modelo (codec de chess_environment.action_codec) para um movimento válido
+        return self.checked_move(actions_to_moves([action], [board])[0], analyze(board))
+
+    def checked_move(self, move, analysis):
+        if analysis.is_legal_uci(move.uci()):
+            return move.uci()
         else:
-            return random.choice(legal_moves).uci()
+            return random.choice(analysis.legal_ucis)
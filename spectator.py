@@ -0,0 +1,138 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import time
+
+import pygame
+
+import match_runner
+import metrics
+from chess_gui import SpectatorGUI
+
+# Fila de eventos dos lances, herdada pelos workers do pool
+events = None
+
+
+def init_spectator_worker(event_queue, *initargs):
+    global events
+    events = event_queue
+    match_runner.init_worker(*initargs)
+
+
+def play_tile(tile, tasks):
+    # Devolve as partidas e a captura de métricas/cProfile do worker, como o play_games_task do match_runner
+    return metrics.run_captured(play_tile_games, tile, tasks, profile=match_runner.profile_worker)
+
+
+def play_tile_games(tile, tasks):
+    # Um worker por tabuleiro: joga as partidas do tile em sequência e publica cada lance na fila.
+    # O put só entrega o evento à thread alimentadora da fila, então a partida nunca espera pela janela
+    results = []
+    for game_index, rl_white, max_plies, seed in tasks:
+        events.put(("start", tile, game_index, rl_white))
+        game = match_runner.play_game(game_index, rl_white, max_plies, seed,
+                                      on_move=lambda move_uci, agent: events.put(("move", tile, move_uci, agent)))
+        events.put(("end", tile, game["result"], game["termination"]))
+        results.append(game)
+    return results
+
+
+def apply_event(gui, event):
+    kind, tile, *payload = event
+    if kind == "start":
+        gui.start_game(tile, *payload)
+    elif kind == "move":
+        gui.push_move(tile, *payload)
+    elif kind == "end":
+        gui.end_game(tile, *payload)
+    return kind
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch several RL vs LLM games at once, one small board per worker")
+    parser.add_argument("--games", type=int, default=4)
+    parser.add_argument("--tiles", type=int, default=4, help="boards on screen; each one is played by its own worker process")
+    parser.add_argument("--max-plies", type=int, default=300)
+    parser.add_argument("--model", default="rl_model.zip")
+    parser.add_argument("--llm-mode", default="score", choices=["score", "sample"])
+    parser.add_argument("--llm-backend", default="eager", choices=["eager", "int8", "onnx"])
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--opening-book", default="book.bin", help="Polyglot opening book consulted before both agents")
+    parser.add_argument("--tablebase", default="syzygy", help="directory with Syzygy tablebases consulted before both agents")
+    parser.add_argument("--share-models", action="store_true",
+                        help="load the models once and fork workers that share the weights copy-on-write")
+    parser.add_argument("--fps", type=int, default=30, help="frame rate cap of the window")
+    parser.add_argument("--close-when-done", action="store_true", help="close the window once every game has finished")
+    metrics.add_cli_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        parser.error(f"RL model not found: {args.model} (train it first by running main.py)")
+    if error := match_runner.backend_dependency_error(args.llm_backend):
+        parser.error(error)
+
+    base_seed = args.seed if args.seed is not None else random.randint(1, 1000000)
+    tiles = max(1, min(args.tiles, args.games))
+    # Cores alternadas como no match_runner; o tile t joga as partidas t, t + tiles, t + 2 * tiles...
+    tasks = [(i, i % 2 == 0, args.max_plies, base_seed + i) for i in range(args.games)]
+    threads_per_worker = max(1, (os.cpu_count() or 1) // tiles)
+
+    print(f"Playing {args.games} games on {tiles} boards (seed {base_seed})")
+    event_queue = multiprocessing.Queue()
+    initargs = (event_queue, args.model, args.llm_mode, args.llm_backend, threads_per_worker, 1, 0.005,
+                args.opening_book, args.tablebase, args.share_models, bool(args.profile), bool(args.trace))
+    # O pool é criado antes da janela: os workers não herdam o estado do SDL
+    if args.share_models:
+        host = match_runner.host_models(args.model, args.llm_mode, args.llm_backend)
+        print(f"Models loaded once in {host.load_time:.1f}s; {host.shared_mb:.0f} MB of weights shared with the workers")
+        pool = host.pool(tiles, initializer=init_spectator_worker, initargs=initargs)
+    else:
+        pool = multiprocessing.Pool(tiles, initializer=init_spectator_worker, initargs=initargs)
+
+    start_time = time.time()
+    with metrics.instrumented(args, prefix="spectator"), pool:
+        results = [pool.apply_async(play_tile, (tile, tasks[tile::tiles])) for tile in range(tiles)]
+        gui = SpectatorGUI(tiles)
+        finished_games = 0
+        running = True
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    running = False
+
+            # Aplica todos os lances que chegaram desde o último quadro e redesenha só os tiles afetados
+            while True:
+                try:
+                    finished_games += apply_event(gui, event_queue.get_nowait()) == "end"
+                except queue.Empty:
+                    break
+            with metrics.timer("spectator_frame_seconds"):
+                pygame.display.update(gui.draw())
+
+            for result in results:
+                if result.ready() and not result.successful():
+                    result.get()  # Levanta o erro do worker
+            if finished_games == len(tasks) and args.close_when_done:
+                running = False
+            gui.clock.tick(args.fps)
+        pygame.quit()
+
+        if finished_games < len(tasks):
+            print("Spectator closed; unfinished games were stopped")
+            return
+        games = []
+        for result in results:
+            tile_games, capture = result.get()
+            metrics.merge_capture(capture)
+            games.extend(tile_games)
+        games.sort(key=lambda game: game["game"])
+
+    summary = match_runner.summarize(games)
+    print(f"RL {summary['rl_wins']} - LLM {summary['llm_wins']} - draws {summary['draws']} "
+          f"in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import random
+
+import chess
+import numpy as np
+import pytest
+
+from chess_environment.action_codec import (NUM_ACTIONS, NUM_BASE_ACTIONS, action_to_move, actions_to_moves,
+                                            legal_action_mask, legal_actions, move_to_action)
+
+
+def assert_round_trip(board):
+    actions = legal_actions(board)
+    moves = list(board.legal_moves)
+    assert (actions >= 0).all()
+    assert len(set(actions.tolist())) == len(moves)  # Ações distintas para lances distintos
+    assert actions_to_moves(actions, [board] * len(moves)) == moves
+    for move in moves:
+        assert action_to_move(move_to_action(move), board) == move
+    mask = legal_action_mask(board)
+    assert mask.shape == (NUM_ACTIONS,) and mask.sum() == len(moves)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_round_trip_random_games(seed):
+    rng = random.Random(seed)
+    board = chess.Board()
+    while not board.is_game_over() and len(board.move_stack) < 200:
+        assert_round_trip(board)
+        board.push(rng.choice(list(board.legal_moves)))
+
+
+@pytest.mark.parametrize("fen, uci", [
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1g1"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1c1"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", "e8c8"),
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2", "e5d6"),
+    ("4k3/8/8/8/3Pp3/8/8/4K3 b - d3 0 2", "e4d3"),
+])
+def test_castling_and_en_passant(fen, uci):
+    board = chess.Board(fen)
+    move = chess.Move.from_uci(uci)
+    assert move in board.legal_moves
+    assert action_to_move(move_to_action(move), board) == move
+    assert_round_trip(board)
+
+
+@pytest.mark.parametrize("fen", ["1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1", "4k3/8/8/8/8/8/p7/1N2K3 b - - 0 1"])
+def test_promotions(fen):
+    board = chess.Board(fen)
+    promotions = [move for move in board.legal_moves if move.promotion]
+    assert len(promotions) == 8  # Avanço e captura, quatro peças cada
+    for move in promotions:
+        action = move_to_action(move)
+        # A dama fica implícita na ação de origem/destino; as subpromoções têm ações próprias
+        assert (action < NUM_BASE_ACTIONS) == (move.promotion == chess.QUEEN)
+        assert action_to_move(action, board) == move
+    assert_round_trip(board)
+
+
+def test_non_pawn_move_to_last_rank_is_not_promoted():
+    board = chess.Board("4k3/8/8/8/8/8/8/R3K3 w - - 0 1")
+    assert action_to_move(move_to_action(chess.Move.from_uci("a1a8")), board).promotion is None
+
+
+def test_every_action_decodes_to_a_distinct_move():
+    moves = {(move.from_square, move.to_square, move.promotion)
+             for move in (action_to_move(action, chess.Board(None)) for action in range(NUM_ACTIONS))}
+    assert len(moves) == NUM_ACTIONS
+    assert np.array_equal(sorted(move_to_action(chess.Move(*move)) for move in moves), np.arange(NUM_ACTIONS))
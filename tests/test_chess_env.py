@@ -0,0 +1,65 @@
+import random
+
+import chess
+import numpy as np
+import pytest
+
+from chess_environment.action_codec import legal_action_mask
+from chess_environment.chess_env import ChessEnvironment
+from chess_environment.encoder import encode_board
+
+
+def assert_in_sync(env):
+    assert np.array_equal(env.observation, encode_board(env.board))
+    assert np.array_equal(env.action_mask, legal_action_mask(env.board))
+
+
+def play_random(env, rng, max_plies=200):
+    while not env.board.is_game_over() and len(env.board.move_stack) < max_plies:
+        env.push(rng.choice(list(env.board.legal_moves)))
+        assert_in_sync(env)
+    while env.board.move_stack:
+        env.undo()
+        assert_in_sync(env)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_push_undo_match_full_encoding(seed):
+    play_random(ChessEnvironment(), random.Random(seed))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_push_undo_match_full_encoding_chess960(seed):
+    rng = random.Random(seed)
+    board = chess.Board(chess960=True)
+    board.set_chess960_pos(rng.randrange(960))
+    env = ChessEnvironment()
+    env.set_board(board)
+    play_random(env, rng)
+
+
+@pytest.mark.parametrize("fen, uci", [
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1g1"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1c1"),
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2", "e5d6"),
+    ("1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1", "a7b8n"),
+    ("1r2k3/8/8/8/8/8/8/1R2K3 w Bb - 0 1", "e1b1"),
+])
+def test_special_moves(fen, uci):
+    env = ChessEnvironment()
+    env.set_board(chess.Board(fen, chess960="Bb" in fen))
+    env.push(chess.Move.from_uci(uci))
+    assert_in_sync(env)
+    env.undo()
+    assert_in_sync(env)
+
+
+def test_step_uses_the_codec():
+    env = ChessEnvironment()
+    env.reset()
+    action = int(np.flatnonzero(env.action_masks())[0])
+    observation, reward, done, info = env.step(action)
+    assert np.array_equal(observation, encode_board(env.board))
+    assert not done and info["action_mask"] is env.action_mask
+    _, reward, done, _ = env.step(int(np.flatnonzero(~env.action_masks())[0]))
+    assert done and reward == -1  # Lance ilegal encerra a partida
@@ -0,0 +1,35 @@
+import pytest
+
+from inference_service import BatchedInferenceService
+
+
+def test_results_follow_input_order():
+    service = BatchedInferenceService(lambda items: [item * 2 for item in items], max_batch_size=4)
+    try:
+        futures = [service.submit(item) for item in range(10)]
+        assert [future.result(timeout=5) for future in futures] == [item * 2 for item in range(10)]
+    finally:
+        service.close()
+
+
+def test_short_result_list_fails_every_request():
+    service = BatchedInferenceService(lambda items: items[:-1], max_batch_size=4, max_wait=0.05)
+    try:
+        futures = [service.submit(item) for item in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="results for"):
+                future.result(timeout=5)
+    finally:
+        service.close()
+
+
+def test_batch_cost_cap():
+    sizes = []
+    service = BatchedInferenceService(lambda items: sizes.append(len(items)) or items, max_batch_size=8,
+                                      max_wait=0.05, cost=lambda item: item, max_batch_cost=10)
+    try:
+        futures = [service.submit(cost) for cost in (4, 4, 4, 12, 1)]
+        assert [future.result(timeout=5) for future in futures] == [4, 4, 4, 12, 1]
+    finally:
+        service.close()
+    assert sizes == [2, 1, 1, 1]
@@ -0,0 +1,41 @@
+import chess
+
+from llm_player.move_cache import MoveCache
+
+
+def boards(count):
+    board = chess.Board()
+    positions = []
+    for move in list(board.legal_moves)[:count]:
+        position = board.copy()
+        position.push(move)
+        positions.append(position)
+    return positions
+
+
+def test_lru_eviction():
+    cache = MoveCache(max_size=2)
+    first, second, third = boards(3)
+    cache.put(first, "e7e5")
+    cache.put(second, "e7e5")
+    assert cache.get(first) == "e7e5"  # first passa a ser o mais recente
+    cache.put(third, "e7e5")
+    assert cache.get(second) is None and cache.get(first) == "e7e5" and cache.get(third) == "e7e5"
+
+
+def test_disk_hit_refreshes_recency(tmp_path):
+    path = str(tmp_path / "moves.db")
+    first, second, third = boards(3)
+    cache = MoveCache(max_size=3, path=path)
+    for board in (first, second, third):
+        cache.put(board, "e7e5")
+    cache.close()
+
+    # Só cabe uma entrada: o aquecimento carrega a mais recente (third); first vem do disco e vira a mais recente
+    cache = MoveCache(max_size=1, path=path)
+    assert cache.get(first) == "e7e5" and cache.stats()["disk_hits"] == 1
+    cache.close()
+
+    cache = MoveCache(max_size=1, path=path)
+    assert cache.get(first) == "e7e5" and cache.stats()["disk_hits"] == 0
+    cache.close()
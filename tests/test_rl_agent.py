@@ -0,0 +1,39 @@
+import chess
+import gymnasium
+import numpy as np
+import pytest
+from stable_baselines3 import PPO
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from chess_environment.vec_env import ChessVecEnv
+from rl_player.rl_agent import RLAgent
+
+MaskablePPO = pytest.importorskip("sb3_contrib").MaskablePPO
+
+
+class FromToEnv(gymnasium.Env):
+    # Espaço de ações de antes das subpromoções: só origem/destino
+    observation_space = gymnasium.spaces.Box(low=0, high=1, shape=(8, 8, 12), dtype=np.float32)
+    action_space = gymnasium.spaces.Discrete(4096)
+
+    def reset(self, seed=None, options=None):
+        return np.zeros((8, 8, 12), dtype=np.float32), {}
+
+    def step(self, action):
+        return np.zeros((8, 8, 12), dtype=np.float32), 0.0, True, False, {}
+
+
+@pytest.mark.parametrize("algorithm, make_env", [
+    (MaskablePPO, lambda: ChessVecEnv(1)),
+    (PPO, lambda: ChessVecEnv(1)),
+    (PPO, lambda: DummyVecEnv([FromToEnv])),
+])
+def test_load_plays_legal_moves(tmp_path, algorithm, make_env):
+    path = tmp_path / "model.zip"
+    algorithm("MlpPolicy", make_env(), n_steps=8, batch_size=8).save(path)
+
+    agent = RLAgent(ChessVecEnv(1))
+    model = agent.load(str(path))
+    assert isinstance(model, algorithm)
+    board = chess.Board()
+    assert chess.Move.from_uci(agent.get_action(board)) in board.legal_moves
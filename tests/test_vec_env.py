@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import metrics
+from chess_environment.vec_env import ChessVecEnv, make_chess_vec_env
+
+MaskablePPO = pytest.importorskip("sb3_contrib").MaskablePPO
+
+
+@pytest.mark.parametrize("use_subprocess", [False, True])
+def test_maskable_ppo_accepts_vec_env(use_subprocess):
+    env = make_chess_vec_env(2, use_subprocess=use_subprocess, n_workers=2)
+    try:
+        model = MaskablePPO("MlpPolicy", env, n_steps=8, batch_size=8, n_epochs=1)
+        model.learn(16)
+    finally:
+        env.close()
+
+
+def test_subprocess_slices_match_in_process():
+    env = make_chess_vec_env(5, use_subprocess=True, n_workers=2)
+    reference = ChessVecEnv(5)
+    rng = np.random.default_rng(0)
+    try:
+        assert np.array_equal(env.reset(), reference.reset())
+        for _ in range(30):
+            masks = np.stack(env.env_method("action_masks"))
+            assert np.array_equal(masks, np.stack(reference.env_method("action_masks")))
+            actions = [rng.choice(np.flatnonzero(mask)) for mask in masks]
+            for ours, theirs in zip(env.step(actions)[:3], reference.step(actions)[:3]):
+                assert np.array_equal(ours, theirs)
+        assert env.has_attr("action_masks") and not env.has_attr("missing")
+    finally:
+        env.close()
+
+
+def test_subprocess_env_counters_reach_the_parent():
+    env = make_chess_vec_env(4, use_subprocess=True, n_workers=2)
+    before = metrics.registry.counters.get(("env_steps_total", ()), 0)
+    try:
+        env.reset()
+        for _ in range(3):
+            env.step([int(np.flatnonzero(mask)[0]) for mask in env.env_method("action_masks")])
+    finally:
+        env.close()
+    assert metrics.registry.counters.get(("env_steps_total", ()), 0) - before == 12
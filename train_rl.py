@@ -0,0 +1,37 @@
+import argparse
+import os
+
+import metrics
+from chess_environment.chess_env import ChessEnvironment
+from rl_player.rl_agent import RLAgent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the RL agent, resuming from the latest checkpoint")
+    parser.add_argument("--timesteps", type=int, default=50000, help="total environment steps, including resumed ones")
+    parser.add_argument("--n-envs", type=int, default=os.cpu_count() or 1, help="boards collecting rollouts in parallel")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="subprocesses the boards are split across (default: one per CPU)")
+    parser.add_argument("--in-process", action="store_true", help="step all boards in this process instead of in subprocesses")
+    parser.add_argument("--checkpoint-freq", type=int, default=10000)
+    parser.add_argument("--checkpoint", default="rl_model_checkpoint.zip")
+    parser.add_argument("--output", default="rl_model.zip")
+    parser.add_argument("--eval-freq", type=int, default=20000, help="steps between evaluation runs (0 disables them)")
+    parser.add_argument("--eval-games", type=int, default=10, help="games against the fallback policy per evaluation")
+    parser.add_argument("--pretrain", metavar="DIR", help="behavior-clone a new model on an experience store before PPO")
+    parser.add_argument("--record-experience", metavar="DIR", help="append the self-play rollouts to an experience store")
+    metrics.add_cli_arguments(parser)
+    args = parser.parse_args()
+
+    rl_player = RLAgent(ChessEnvironment())
+    rl_player.model_path = args.output
+    rl_player.checkpoint_path = args.checkpoint
+    with metrics.instrumented(args, prefix="training"):
+        rl_player.train(total_timesteps=args.timesteps, checkpoint_freq=args.checkpoint_freq,
+                        n_envs=args.n_envs, use_subprocess=not args.in_process,
+                        eval_freq=args.eval_freq, eval_games=args.eval_games,
+                        pretrain_dir=args.pretrain, experience_dir=args.record_experience, n_workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()